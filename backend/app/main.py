@@ -23,6 +23,19 @@ from fastapi.middleware.cors import CORSMiddleware
 from .routes.Alert_route import alert_router
 from .routes.sms import sms_router
 from .routes import contact
+from .routes.metrics import router as metrics_router
+from .routes.advice_routes import router as advice_router
+from .utils.AI_support import advice_pool
+from .utils.fuzzy import load_advice_index
+from .services.ussd_sessions import start_session_flusher, stop_session_flusher
+from .services.ussd_reaper import start_session_reaper, stop_session_reaper
+from .services.weather import close_weather_client, open_weather_client
+from .services.gazetteer import load_gazetteer
+from .services.alert_index import load_active_alerts
+from .services.forecast_digest import start_forecast_digest, stop_forecast_digest
+from .scripts.migrate_weather_alerts import migrate_weather_alerts
+from .services.weather_prefetch import start_weather_prefetcher, stop_weather_prefetcher
+from .services.weather_history import ensure_history_index, start_weather_history, stop_weather_history
 
 
 app = FastAPI(
@@ -45,6 +58,29 @@ app.add_middleware(
 @app.on_event("startup")
 def on_startup():
     create_db_and_tables()  # This will create tables on app startup
+    ensure_history_index()  # (location, recorded_at) index on WeatherData, also for existing databases
+    load_gazetteer()  # Seed and index the local table of Ugandan places
+    migrate_weather_alerts()  # location_key column and index on WeatherAlert, for existing databases
+    load_active_alerts()  # In-memory index of current weather alerts for the USSD alerts menu
+    start_session_flusher()  # Write-behind persistence of finished USSD sessions
+    start_session_reaper()  # Archives/prunes old rows from the USSDSession table
+    load_advice_index()  # Answered advice questions, matched before asking Bedrock again
+    advice_pool.start()  # Bedrock workers for AI advice
+    open_weather_client()  # One pooled keep-alive client for all OpenWeather calls
+    start_weather_prefetcher()  # Keeps the weather cache warm for registered farmers' locations
+    start_weather_history()  # Bulk-writes fetched observations into WeatherData
+    start_forecast_digest()  # Morning forecast SMS to farmers, when FORECAST_DIGEST_HOUR is set
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    stop_session_reaper()
+    stop_weather_prefetcher()
+    stop_forecast_digest()
+    await stop_weather_history()  # Write out buffered observations
+    await stop_session_flusher()  # Persist whatever is still held in the session store
+    await advice_pool.stop()
+    await close_weather_client()
 
 app.include_router(ussd_router)
 app.include_router(farmer_router)
@@ -57,6 +93,8 @@ app.include_router(admin_router)
 app.include_router(alert_router)
 app.include_router(sms_router)
 app.include_router(contact.router)
+app.include_router(metrics_router)
+app.include_router(advice_router)
 
 @app.get("/")
 def read_root():
@@ -4,7 +4,7 @@ from typing import Literal, Optional, List, Dict, Any
 
 from enum import Enum
 from app.schemas import UserRole
-from sqlalchemy import JSON as SQLAlchemyJSON
+from sqlalchemy import JSON as SQLAlchemyJSON, Index
 
 from sqlmodel import  Column, SQLModel, Field, Relationship, JSON
 
@@ -92,16 +92,36 @@ class AgricultureAlert(SQLModel, table=True):
     authority: Optional[AgricultureAuthority] = Relationship(back_populates="alerts")
 
 class WeatherData(SQLModel, table=True):
+    # Time series of observed weather; queries filter on location and a recorded_at range
+    __table_args__ = (Index("ix_weatherdata_location_recorded_at", "location", "recorded_at"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    location: str = Field(index=True)
+    location: str  # Weather cell, "lat,lon" rounded to WEATHER_COORD_PRECISION
     temperature:float # Temperature in Celsius
-    precipitation:float
-    recorded_at:datetime = Field(default_factory=datetime.utcnow)
+    precipitation:float # Rain in the last hour (mm)
+    recorded_at:datetime = Field(default_factory=datetime.utcnow)  # Observation time (UTC)
+
+class GazetteerPlace(SQLModel, table=True):
+    # Known Ugandan places: the bundled gazetteer plus names resolved by the geocoding API
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str
+    name_key: str = Field(unique=True, index=True)  # Normalized name used for lookups
+    kind: str  # Example: "district", "town", "subcounty", "geocoded"
+    district: Optional[str] = None
+    region: Optional[str] = None
+    lat: float
+    lon: float
+    source: str = Field(default="bundled")  # "bundled" or "geocoded"
+    created_at: datetime = Field(default_factory=datetime.utcnow)
 
 
 class WeatherAlert(SQLModel, table=True):
+    # Active-alert lookups filter on location_key and the effective/expires window
+    __table_args__ = (Index("ix_weatheralert_location_key_window", "location_key", "effective_time", "expires_time"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     location: str = Field(index=True)
+    location_key: str = Field(default="")  # Normalized place name (see services/alert_index.py)
     alert_message: str
     severity: str  # Example: "High", "Medium", "Low"
     alert_type: str  # Example: "Flood", "Drought", "Frost"
@@ -140,6 +160,17 @@ class USSDSession(SQLModel, table=True):
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
     farmer: Optional["Farmer"] = Relationship(back_populates="sessions")
+
+class USSDSessionArchive(SQLModel, table=True):
+    # Compact record of a completed USSD session, moved out of USSDSession by the session reaper
+    id: Optional[int] = Field(default=None, primary_key=True)
+    session_id: str
+    phone_number: str = Field(index=True)
+    farmer_id: Optional[int] = None
+    final_step: str  # The last_step the session ended on, e.g. "REPORT_COMPLETE"
+    started_at: datetime
+    ended_at: Optional[datetime] = None
+
 class Advice(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     query_text: str
@@ -1,11 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlmodel import Session, select, func
+from dataclasses import asdict
 from typing import List
 
 from app.models import AgricultureAlert, AgricultureAuthority, FarmerReport, TransportProvider, TransportRequest, User, Farmer, UserRole, WeatherAlert
 from app.schemas import AdminDashboardSummaryResponse, UserCreate, UserRead, FarmerCreate, TransportProviderCreate, AgricultureAuthorityCreate, AdminCreate, RecentReportResponse, RecentActivityResponse
 from app.database import get_session
 from app.auth.security import hash_password
+from app.services.farmer_cache import farmer_cache
+from app.services.weather_prefetch import prefetch_weather
+from app.utils.quota import PRIORITY_BACKGROUND, call_priority
 from app.auth.jwt_handler import decode_access_token, require_admin, require_transport_provider
 
 
@@ -82,6 +86,7 @@ def register_farmer(
     session.add(new_farmer)
     session.commit()
     session.refresh(new_farmer)
+    farmer_cache.invalidate(new_farmer.phone)
     
     return {
         "message": "Farmer registered successfully", 
@@ -387,4 +392,11 @@ def get_recent_activity(
     
     # Sort by timestamp and return latest
     activities.sort(key=lambda x: x.timestamp, reverse=True)
-    return activities[:limit]
\ No newline at end of file
+    return activities[:limit]
+
+@router.post("/weather/prefetch")
+async def run_weather_prefetch(admin_user: User = Depends(require_admin)):
+    """Warm this server's weather cache for every farmer location now, without waiting for the next scheduled run"""
+    with call_priority(PRIORITY_BACKGROUND):
+        result = await prefetch_weather()
+    return asdict(result)
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+
+from ..services.advice_queue import AdviceQueueFull
+from ..utils.AI_support import get_ai_advice
+
+router = APIRouter(prefix="/advice", tags=["Advice"])
+
+
+class AdviceRequest(BaseModel):
+    query: str
+
+
+@router.post("")
+async def request_advice(data: AdviceRequest):
+    """Get AI farming advice. Requests share the advice worker pool with USSD."""
+    if not data.query.strip():
+        raise HTTPException(status_code=400, detail="Query is required")
+    try:
+        advice = await get_ai_advice(data.query.strip())
+    except AdviceQueueFull:
+        raise HTTPException(status_code=503, detail="Advice service is busy. Please try again shortly.")
+    return {"query": data.query, "advice": advice}
@@ -1,14 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from ..models import AgricultureAlert, FarmerReport, Farmer
 from typing import List
 from app.auth.jwt_handler import require_agriculture_authority
-from ..database import get_session
+from ..database import get_async_session
 
 router = APIRouter(prefix="/agric_auth", tags=["Agric Authority"])
 
 @router.get("/Reports", response_model=List[dict])
-async def get_reports(session: Session = Depends(get_session), user=Depends(require_agriculture_authority)):
+async def get_reports(session: AsyncSession = Depends(get_async_session), user=Depends(require_agriculture_authority)):
     """Get all farmer reports with farmer details"""
     try:
         # Join FarmerReport with Farmer to get farmer details
@@ -16,7 +17,7 @@ async def get_reports(session: Session = Depends(get_session), user=Depends(requ
             Farmer, FarmerReport.farmer_id == Farmer.id
         ).order_by(FarmerReport.timestamp.desc())
         
-        results = session.exec(query).all()
+        results = (await session.exec(query)).all()
         
         if not results:
             return []
@@ -44,7 +45,7 @@ async def get_reports(session: Session = Depends(get_session), user=Depends(requ
         raise HTTPException(status_code=500, detail="Failed to fetch reports")
 
 @router.post("/Agric_alerts")
-async def create_agric_alert(alert: AgricultureAlert, session: Session = Depends(get_session), user=Depends(require_agriculture_authority)):
+async def create_agric_alert(alert: AgricultureAlert, session: AsyncSession = Depends(get_async_session), user=Depends(require_agriculture_authority)):
     agric_alert = AgricultureAlert(
         alert_type=alert.alert_type,
         description=alert.description,
@@ -52,28 +53,28 @@ async def create_agric_alert(alert: AgricultureAlert, session: Session = Depends
         authority_id=alert.authority_id,
     )
     session.add(agric_alert)
-    session.commit()
-    session.refresh(agric_alert)
+    await session.commit()
+    await session.refresh(agric_alert)
     return agric_alert
 
 @router.patch("/reports/{report_id}/resolve")
-async def resolve_farmer_report(report_id: int, session: Session = Depends(get_session), user=Depends(require_agriculture_authority)):
-    report = session.get(FarmerReport, report_id)
+async def resolve_farmer_report(report_id: int, session: AsyncSession = Depends(get_async_session), user=Depends(require_agriculture_authority)):
+    report = await session.get(FarmerReport, report_id)
     if not report:
         raise HTTPException(status_code=404, detail="Report not found")
     
     report.status = "Resolved"
     session.add(report)
-    session.commit()
-    session.refresh(report)
+    await session.commit()
+    await session.refresh(report)
 
     return {"message": "Report marked as resolved", "report_id": report.id, "status": report.status}
 
 @router.get("/reports/summary")
-async def get_report_summary(session: Session = Depends(get_session), user=Depends(require_agriculture_authority)):
+async def get_report_summary(session: AsyncSession = Depends(get_async_session), user=Depends(require_agriculture_authority)):
     """Get comprehensive report summary statistics"""
     try:
-        all_reports = session.exec(select(FarmerReport)).all()
+        all_reports = (await session.exec(select(FarmerReport))).all()
         
         summary = {
             "total_reports": len(all_reports),
@@ -98,9 +99,9 @@ async def get_report_summary(session: Session = Depends(get_session), user=Depen
         raise HTTPException(status_code=500, detail="Failed to fetch report summary")
 
 @router.get("/alerts/count")
-async def get_alert_count(session: Session = Depends(get_session), user=Depends(require_agriculture_authority)):
+async def get_alert_count(session: AsyncSession = Depends(get_async_session), user=Depends(require_agriculture_authority)):
     try:
-        alerts = session.exec(select(AgricultureAlert)).all()
+        alerts = (await session.exec(select(AgricultureAlert))).all()
         return {
             "total_alerts": len(alerts)
         }
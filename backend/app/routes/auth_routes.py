@@ -1,7 +1,8 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
-from app.database import get_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.database import get_async_session, get_session
 from app.models import User
 from app.schemas import UserCreate, LoginData, Token, UserRead
 from app.auth.security import hash_password, verify_password
@@ -16,9 +17,9 @@ from fastapi.security import OAuth2PasswordRequestForm
 @router.post("/login", response_model=Token)
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
-    user = session.exec(select(User).where(User.username == form_data.username)).first()
+    user = (await session.exec(select(User).where(User.username == form_data.username))).first()
     if not user or not verify_password(form_data.password, user.password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
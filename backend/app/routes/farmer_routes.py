@@ -5,6 +5,7 @@ from sqlmodel import select
 from ..models import Farmer, FarmerReport, WeatherAlert, User
 
 from ..database import SessionDep
+from ..services.farmer_cache import farmer_cache
 from app.auth.jwt_handler import decode_access_token, require_admin, require_agriculture_authority
 
 router = APIRouter(prefix="/farmers", tags=["Farmers"])
@@ -30,6 +31,7 @@ def delete_farmer(farmer_id: int, session: SessionDep, admin_user: User = Depend
         raise HTTPException(status_code=404, detail="Farmer not found")
     session.delete(farmer)
     session.commit()
+    farmer_cache.invalidate(farmer.phone)
     return "Farmer deleted successfully"
 
 # Farmer Reports Endpoints
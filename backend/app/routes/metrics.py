@@ -0,0 +1,60 @@
+from fastapi import APIRouter
+
+from .ussd import menu
+from ..services.farmer_cache import farmer_cache
+from ..services.ussd_sessions import session_store
+from ..services.ussd_deadline import deadline_stats
+from ..services.ussd_idempotency import hop_replies
+from ..services.ussd_reaper import reaper_stats
+from ..services.gazetteer import gazetteer
+from ..services.weather import geocode_flights, weather_breaker, weather_cache, weather_quota, weather_retry_budget
+from ..services.weather_prefetch import prefetch_stats
+from ..services.weather_history import weather_history
+from ..services.weather_alerts import alert_stats
+from ..services.alert_index import active_alerts
+from ..services.forecast_digest import digest_stats
+from ..utils.AI_support import advice_pool
+from ..utils.fuzzy import advice_index
+
+router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+
+@router.get("/ussd")
+async def ussd_metrics():
+    """Per-state USSD handler timings, session store occupancy, farmer cache hit rate and retried hops."""
+    return {
+        "states": menu.timing_snapshot(),
+        "sessions": await session_store.stats(),
+        "farmer_cache": farmer_cache.stats(),
+        "deadline": dict(deadline_stats),
+        "retries": hop_replies.stats(),
+        "reaper": reaper_stats(),
+    }
+
+
+@router.get("/weather")
+def weather_metrics():
+    """
+    Gazetteer and weather cache hit rates, upstream calls coalesced during bursts, the last
+    prefetch run, OpenWeather circuit breaker state and retry budget, call quota usage
+    (with projected exhaustion time and current TTL multiplier), the observation history
+    writer, the last alert generation run and the last forecast SMS digest.
+    """
+    return {
+        "gazetteer": gazetteer.stats(),
+        "cache": weather_cache.stats(),
+        "geocode_requests": geocode_flights.stats(),
+        "prefetch": prefetch_stats(),
+        "breaker": weather_breaker.stats(),
+        "retry_budget": weather_retry_budget.stats(),
+        "quota": weather_quota.stats(),
+        "history": weather_history.stats(),
+        "alerts": {**alert_stats(), "index": active_alerts.stats()},
+        "digest": digest_stats(),
+    }
+
+
+@router.get("/advice")
+def advice_metrics():
+    """Advice worker pool queue depth and throughput, and the advice index hit rate."""
+    return {**advice_pool.stats(), "index": advice_index.stats()}
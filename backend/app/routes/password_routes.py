@@ -1,7 +1,8 @@
 import datetime
 from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
-from app.database import get_session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.database import get_async_session
 from app.models import User
 from app.schemas import PasswordResetRequest, PasswordResetConfirm
 from app.auth.email_utils import send_reset_email, send_success_email
@@ -15,8 +16,8 @@ import random
 import datetime
 
 @router.post("/request-password-reset")
-async def request_reset(data: PasswordResetRequest, session: Session = Depends(get_session)):
-    user = session.exec(select(User).where(User.email == data.email)).first()
+async def request_reset(data: PasswordResetRequest, session: AsyncSession = Depends(get_async_session)):
+    user = (await session.exec(select(User).where(User.email == data.email))).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -27,15 +28,15 @@ async def request_reset(data: PasswordResetRequest, session: Session = Depends(g
     user.reset_code = code
     user.reset_code_expiry = expiry
     session.add(user)
-    session.commit()
+    await session.commit()
 
     await send_reset_email(user.email, code)
     return {"message": "Password reset code sent to email"}
 
 
 @router.post("/reset-password")
-async def reset_password(data: PasswordResetConfirm, session: Session = Depends(get_session)):
-    user = session.exec(select(User).where(User.reset_code == data.code)).first()
+async def reset_password(data: PasswordResetConfirm, session: AsyncSession = Depends(get_async_session)):
+    user = (await session.exec(select(User).where(User.reset_code == data.code))).first()
     if not user:
         raise HTTPException(status_code=400, detail="Invalid reset code")
 
@@ -46,7 +47,7 @@ async def reset_password(data: PasswordResetConfirm, session: Session = Depends(
     user.reset_code = None
     user.reset_code_expiry = datetime.datetime.min
     session.add(user)
-    session.commit()
+    await session.commit()
     
     await send_success_email(user.email, "Your password has been successfully reset.")
 
@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
 from pydantic import BaseModel
@@ -15,6 +16,15 @@ africastalking.initialize(
     api_key=AFRICASTALKING_API_KEY
 )
 sms = africastalking
+SMS_SENDER_ID = os.getenv("SMS_SENDER_ID") or None
+
+
+async def deliver_sms(phone_numbers: List[str], message: str):
+    """
+    Send an SMS from async code. The Africa's Talking SDK call is blocking HTTP,
+    so it runs in a worker thread instead of on the event loop.
+    """
+    return await asyncio.to_thread(africastalking.SMS.send, message, phone_numbers, sender_id=SMS_SENDER_ID)
 
 sms_router = APIRouter(prefix="/sms", tags=["SMS"])
 alert_router = APIRouter(prefix="/alerts", tags=["Alerts"])
@@ -1,8 +1,9 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.models import TransportRequest, User, Farmer
-from app.database import get_session
+from app.database import get_async_session
 from app.auth.jwt_handler import require_transport_provider
 from pydantic import BaseModel
 import logging
@@ -16,7 +17,7 @@ class StatusUpdateRequest(BaseModel):
 
 @router.get("/transport_requests")
 async def get_transport_requests(
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     transport_provider: User = Depends(require_transport_provider),
 ):
     """Get all transport requests with farmer details"""
@@ -26,7 +27,7 @@ async def get_transport_requests(
             Farmer, TransportRequest.farmer_id == Farmer.id
         ).order_by(TransportRequest.timestamp.desc())
         
-        results = session.exec(query).all()
+        results = (await session.exec(query)).all()
         
         if not results:
             return []
@@ -57,7 +58,7 @@ async def get_transport_requests(
 async def update_transport_request(
     request_id: int, 
     status_update: StatusUpdateRequest,  # Properly typed Pydantic model
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     transport_provider: User = Depends(require_transport_provider)
 ):
     """Update transport request status"""
@@ -65,7 +66,7 @@ async def update_transport_request(
         logger.info(f"Transport provider {transport_provider.id} updating request {request_id} to status {status_update.status}")
         
         # Get the transport request
-        db_request = session.get(TransportRequest, request_id)
+        db_request = await session.get(TransportRequest, request_id)
         if not db_request:
             logger.warning(f"Transport request {request_id} not found")
             raise HTTPException(status_code=404, detail="Transport request not found")
@@ -109,8 +110,8 @@ async def update_transport_request(
             db_request.updated_at = datetime.utcnow()
         
         session.add(db_request)
-        session.commit()
-        session.refresh(db_request)
+        await session.commit()
+        await session.refresh(db_request)
         
         logger.info(f"Successfully updated transport request {request_id} from '{old_status}' to '{status_update.status}'")
         
@@ -123,10 +124,10 @@ async def update_transport_request(
         }
         
     except HTTPException:
-        session.rollback()
+        await session.rollback()
         raise
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         logger.error(f"Unexpected error updating transport request {request_id}: {str(e)}")
         raise HTTPException(
             status_code=500, 
@@ -135,7 +136,7 @@ async def update_transport_request(
 
 @router.get("/transport_requests/history")
 async def get_transport_history(
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     transport_provider: User = Depends(require_transport_provider)
 ):
     """Get transport history for completed/cancelled requests"""
@@ -146,7 +147,7 @@ async def get_transport_history(
             TransportRequest.status.in_(["Completed", "Cancelled", "Rejected"])
         ).order_by(TransportRequest.timestamp.desc())
         
-        results = session.exec(query).all()
+        results = (await session.exec(query)).all()
         
         if not results:
             return []
@@ -177,7 +178,7 @@ async def get_transport_history(
 
 @router.get("/summary")
 async def get_transport_summary(
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     transport_provider: User = Depends(require_transport_provider)
 ):
     """Get transport summary statistics for the dashboard"""
@@ -186,7 +187,7 @@ async def get_transport_summary(
         all_requests_query = select(TransportRequest).join(
             Farmer, TransportRequest.farmer_id == Farmer.id
         )
-        all_requests = session.exec(all_requests_query).all()
+        all_requests = (await session.exec(all_requests_query)).all()
         
         # Calculate statistics
         total_requests = len(all_requests)
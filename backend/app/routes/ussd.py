@@ -1,32 +1,294 @@
 from fastapi import APIRouter, Depends, Request, Form
 from fastapi.responses import PlainTextResponse
-from sqlmodel import Session, select
-from app.database import get_session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.database import get_async_session
 from app.models import Farmer, FarmerReport, TransportRequest, USSDSession, WeatherAlert, WeatherData
+from dataclasses import dataclass
 from datetime import datetime
 from ..services.weather import format_weather_response
 from app.models import Advice
 from app.utils.AI_support import get_ai_advice
+from app.services.ussd_engine import DialPath, MenuRegistry, Reply, USSDContext, end
+from app.services.farmer_cache import farmer_cache
+from app.services.ussd_sessions import SESSION_COMPLETED, load_persisted_session, session_store
+from app.services.ussd_deadline import DEFERRED_REPLY, hop_deadline, reply_or_defer
+from app.services.ussd_idempotency import hop_replies
+from app.services.alert_index import active_alerts
+from app.utils.quota import PRIORITY_USSD, call_priority
 import json
 import traceback # Import for detailed error logging
 
 router = APIRouter()
 
+# All USSD menu states. Handlers below register themselves with @menu.state(...)
+menu = MenuRegistry(fallback=end("Session expired or invalid state. Please try again.", "INITIAL"))
+
+FARMER_WELCOME = """Welcome back to ChapFarm
+1. Get Weather Update
+2. View Weather Alerts
+3. Get Advice
+4. Report issue
+5. Request transport"""
+
+GUEST_WELCOME = """Welcome to ChapFarm
+1. Register
+2. Get Weather (Guest)"""
+
+WEATHER_OPTIONS = """Weather Options:
+1. Current Weather
+2. 5-Day Forecast"""
+
+TRANSPORT_TYPES = {
+    "1": "Bicycle",
+    "2": "Motorcycle",
+    "3": "Van",
+    "4": "Lorry"
+}
+
+# Main menu choice -> the state it leads to
+GUEST_MENU = {"1": "REGISTER_NAME", "2": "GUEST_WEATHER"}
+FARMER_MENU = {"1": "FARMER_WEATHER", "2": "ALERT_ENTER_LOCATION", "3": "GET_ADVICE", "4": "REPORT_ISSUE", "5": "REQUEST_TRANSPORT"}
+
+INVALID_OPTION = end("Invalid option. Please try again.", "MAIN_MENU")
+
+
+# --- Parsed inputs ---
+# The dial path accumulates every answer, e.g. 1*Ann Karagwa*Kampala*Central for registration,
+# so each flow reads its fields by position.
+
+@dataclass(frozen=True)
+class Registration:
+    name: str
+    location: str
+    region: str
+
+
+@dataclass(frozen=True)
+class WeatherRequest:
+    option: str
+    location: str
+
+
+@dataclass(frozen=True)
+class IssueReport:
+    issue_type: str
+    description: str
+
+
+@dataclass(frozen=True)
+class TransportOrder:
+    transport_type: str
+    pickup_location: str
+    delivery_location: str
+
+
+def parse_registration(path: DialPath) -> Registration:
+    return Registration(name=path.at(1, "Unknown"), location=path.at(2, "Unknown"), region=path.at(3, "Unknown"))
+
+
+def parse_weather_request(path: DialPath) -> WeatherRequest:
+    return WeatherRequest(option=path.at(1), location=path.at(2, "Unknown"))
+
+
+def parse_issue_report(path: DialPath) -> IssueReport:
+    return IssueReport(issue_type=path.at(1, "Unknown"), description=path.at(2, "No description provided"))
+
+
+def parse_transport_order(path: DialPath) -> TransportOrder:
+    return TransportOrder(
+        transport_type=TRANSPORT_TYPES.get(path.at(1), "Unknown"),
+        pickup_location=path.at(2),
+        delivery_location=path.at(3, "Unknown"),
+    )
+
+
+# --- Menu states ---
+
+@menu.state("INITIAL")
+async def initial(ctx: USSDContext, _) -> Reply:
+    return Reply(f"CON {FARMER_WELCOME if ctx.farmer else GUEST_WELCOME}", "MAIN_MENU")
+
+
+@menu.state("MAIN_MENU")
+async def main_menu(ctx: USSDContext, _) -> Reply:
+    return menu.choose(ctx.path.latest, FARMER_MENU if ctx.farmer else GUEST_MENU, INVALID_OPTION)
+
+
+# REGISTRATION flow
+menu.add("REGISTER_NAME", prompt="Enter your full name:", then="REGISTER_LOCATION")
+menu.add("REGISTER_LOCATION", prompt="Enter your location:", then="REGISTER_REGION")
+
+
+@menu.state("REGISTER_REGION", prompt="Enter your region:", parser=parse_registration)
+async def register_region(ctx: USSDContext, registration: Registration) -> Reply:
+    new_farmer = Farmer(
+        name=registration.name,
+        phone=ctx.phone_number,
+        location=registration.location,
+        region=registration.region
+    )
+    ctx.db.add(new_farmer)
+    # Flush (not commit) so the new farmer's ID is available for the session state
+    await ctx.db.flush()
+
+    # Link the newly created farmer's ID to the USSD session
+    ctx.state.farmer_id = new_farmer.id
+    # This number was cached as unregistered. Dropped only once the farmer row is committed, or a
+    # concurrent hop could re-cache "not registered" from the database in between
+    ctx.after_commit.append(lambda: farmer_cache.invalidate(ctx.phone_number))
+    return end(f"""Registration successful!
+Name: {registration.name}
+Location: {registration.location}
+Region: {registration.region}
+You can now access full features.""", "REGISTER_COMPLETE")
+
+
+# WEATHER inquiry flow
+menu.add("FARMER_WEATHER", prompt=WEATHER_OPTIONS, then="WEATHER_ENTER_LOCATION")
+menu.add("GUEST_WEATHER", prompt=WEATHER_OPTIONS, then="WEATHER_ENTER_LOCATION")
+
+
+@menu.state("WEATHER_ENTER_LOCATION", prompt="Enter the location:", parser=parse_weather_request)
+async def weather_enter_location(ctx: USSDContext, request: WeatherRequest) -> Reply:
+    try:
+        response = await reply_or_defer(
+            format_weather_response(request.option, request.location),
+            ctx.phone_number,
+            ctx.deadline,
+            error_text=f"Sorry, we couldn't fetch the weather for {request.location}. Please try again later.",
+        )
+        if response is None:
+            return end(DEFERRED_REPLY, "WEATHER_DEFERRED")
+        return Reply(response, "WEATHER_RESPONSE")
+    except Exception as e:
+        print(f"Weather error: {e}")
+        return end(f"Error fetching weather data. Please try again later. The error is {e}", "INITIAL")
+
+
+# GET ADVICE flow
+async def _advice_reply(issue: str) -> str:
+    return f"END Advice:\n{await get_ai_advice(user_input=issue)}"
+
+
+@menu.state("GET_ADVICE", prompt="Enter your advice request:")
+async def get_advice(ctx: USSDContext, _) -> Reply:
+    issue = ctx.path.at(1)
+    if not issue:
+        return end("Please describe what you need advice on.", "INITIAL")
+    try:
+        response = await reply_or_defer(_advice_reply(issue), ctx.phone_number, ctx.deadline,
+                                        error_text="Sorry, we couldn't get advice right now. Try again later.")
+        if response is None:
+            return end(DEFERRED_REPLY, "ADVICE_DEFERRED")
+        return Reply(response, "ADVICE_RESPONSE")
+    except Exception as e:
+        print("AI ERROR:", e)
+        return end("Sorry, we couldn't get advice right now. Try again later.", "ADVICE_RESPONSE")
+
+
+# WEATHER ALERTS flow
+@menu.state("ALERT_ENTER_LOCATION", prompt="Enter your location for weather alerts:")
+async def alert_enter_location(ctx: USSDContext, _) -> Reply:
+    location = ctx.path.at(1)
+    if not location:
+        return end("Location cannot be empty for weather alerts. Please try again.", "INITIAL")
+    try:
+        return Reply(await format_alert_response(location), "ALERT_RESPONSE_FINAL")
+    except Exception as e:
+        print(f"Alerts error: {traceback.format_exc()}")
+        return end("Error fetching weather alerts. Please try again later.", "INITIAL")
+
+
+# REPORT ISSUE flow
+menu.add("REPORT_ISSUE", prompt="Enter your issue type:", then="REPORT_DESCRIPTION")
+
+
+@menu.state("REPORT_DESCRIPTION", prompt="Enter your issue description:", parser=parse_issue_report)
+async def report_description(ctx: USSDContext, report: IssueReport) -> Reply:
+    # CRITICAL CHECK: Ensure farmer_id is available before creating FarmerReport
+    if ctx.state.farmer_id is None:
+        return end("You must be a registered farmer to report an issue. Please register first.", "INITIAL")
+
+    new_report = FarmerReport(
+        farmer_id=ctx.state.farmer_id,
+        issue_type=report.issue_type,
+        description=report.description,
+        location=ctx.farmer.location if ctx.farmer else "Unknown",
+        status="Pending"
+    )
+    ctx.db.add(new_report)
+    return end(f"Report submitted successfully!\nIssue: {report.issue_type}\nDescription: {report.description}", "REPORT_COMPLETE")
+
+
+# REQUEST TRANSPORT flow
+menu.add("REQUEST_TRANSPORT", prompt="""Select transport need:
+1. Bicycle
+2. Motorcycle
+3. Van
+4. Lorry""", then="TRANSPORT_PICKUP")
+
+
+@menu.state("TRANSPORT_PICKUP", prompt="Enter pickup location:")
+async def transport_pickup(ctx: USSDContext, _) -> Reply:
+    ctx.state.temp_data["pickup_location"] = ctx.path.latest
+    return menu.enter("TRANSPORT_DELIVERY")
+
+
+@menu.state("TRANSPORT_DELIVERY", prompt="Enter delivery location:", parser=parse_transport_order)
+async def transport_delivery(ctx: USSDContext, order: TransportOrder) -> Reply:
+    pickup_location = order.pickup_location or ctx.state.temp_data.get("pickup_location", "Unknown")
+
+    # CRITICAL CHECK: Ensure farmer_id is available before creating TransportRequest
+    if ctx.state.farmer_id is None:
+        return end("You must be a registered farmer to request transport. Please register first.", "INITIAL")
+
+    new_transport_request = TransportRequest(
+        farmer_id=ctx.state.farmer_id,
+        transport_type=order.transport_type,
+        pickup_location=pickup_location,
+        dropoff_location=order.delivery_location,
+        status="Pending"
+    )
+    ctx.db.add(new_transport_request)
+    return end(f"Transport request submitted successfully!\nType: {order.transport_type}\nPickup: {pickup_location}\nDelivery: {order.delivery_location}", "TRANSPORT_COMPLETE")
+
+
 @router.post("/ussd")
 async def ussd_callback(
     sessionId: str = Form(...),
     serviceCode: str = Form(...),
     phoneNumber: str = Form(...),
     text: str = Form(""),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
-    response = ""
-    user_input = text.strip()
+    try:
+        # Gateway retries of a hop we already answered (or are still answering) get the same
+        # reply instead of being processed twice
+        with call_priority(PRIORITY_USSD):  # Farmers on a USSD session come first for OpenWeather quota
+            reply_text = await hop_replies.run(sessionId, text, lambda: handle_hop(sessionId, phoneNumber, text, session))
+        return PlainTextResponse(reply_text)
+
+    except Exception as e:
+        print(f"An error occurred during USSD callback: {e}")
+        traceback.print_exc() # Print full traceback for detailed debugging
+        return PlainTextResponse("END An unexpected error occurred. Please try again later.")
+
+
+async def handle_hop(sessionId: str, phoneNumber: str, text: str, session: AsyncSession) -> str:
+    """Process one USSD hop and return the reply text."""
+    path = DialPath.parse(text)
+    deadline = hop_deadline()
 
     try:
-        # Get or create session
-        db_session = session.exec(select(USSDSession).where(USSDSession.session_id == sessionId)).first()
-        if not db_session:
+        # Get or create session. Live sessions are held in the session store, not the database;
+        # a continuing session (non-empty text) missing from the store is looked up in the table
+        # in case this worker was restarted mid-session.
+        db_session = await session_store.get(sessionId)
+        if not db_session and path.raw:
+            db_session = await load_persisted_session(sessionId)
+        new_session = not db_session
+        if new_session:
             db_session = USSDSession(
                 session_id=sessionId,
                 phone_number=phoneNumber,
@@ -34,11 +296,9 @@ async def ussd_callback(
                 farmer_id=None,
                 temp_data={}
             )
-            session.add(db_session)
-            # No commit here yet, will commit at the end if successful
 
-        # Get farmer associated with the phone number
-        farmer = session.exec(select(Farmer).where(Farmer.phone == phoneNumber)).first()
+        # Get farmer associated with the phone number (cached, a farmer doesn't change mid-session)
+        farmer = await farmer_cache.lookup(session, phoneNumber)
 
         # CRITICAL FIX: Ensure db_session.farmer_id is always up-to-date
         # If a farmer exists for this phone number, link it to the session.
@@ -46,298 +306,62 @@ async def ussd_callback(
         # or if db_session.farmer_id somehow became stale.
         if farmer and db_session.farmer_id != farmer.id:
             db_session.farmer_id = farmer.id
-            session.add(db_session) # Mark db_session for update
-
-        last_step = db_session.last_step or "INITIAL"
 
         # Initialize temp_data if it's None (important for new sessions or corrupted data)
         if db_session.temp_data is None:
             db_session.temp_data = {}
 
-        # --- USSD Workflow Logic ---
-
-        # INITIAL entry point or unhandled state
-        if last_step == "INITIAL":
-            if farmer:
-                response = """CON Welcome back to ChapFarm
-1. Get Weather Update
-2. View Weather Alerts
-3. Get Advice
-4. Report issue
-5. Request transport"""
-            else:
-                response = """CON Welcome to ChapFarm
-1. Register
-2. Get Weather (Guest)"""
-            db_session.last_step = "MAIN_MENU"
-
-        # MAIN_MENU handling user choices
-        elif last_step == "MAIN_MENU":
-            if not farmer: # Guest user
-                if user_input == "1":
-                    response = "CON Enter your full name:"
-                    db_session.last_step = "REGISTER_NAME"
-                elif user_input == "2":
-                    response = """CON Weather Options:
-1. Current Weather
-2. 5-Day Forecast"""
-                    db_session.last_step = "GUEST_WEATHER"
-                else:
-                    response = "END Invalid option. Please try again."
-            else: # Registered farmer
-                if user_input == "1":
-                    response = """CON Weather Options:
-1. Current Weather
-2. 5-Day Forecast"""
-                    db_session.last_step = "FARMER_WEATHER"
-                elif user_input == "2":
-                    response = "CON Enter your location for weather alerts:"
-                    db_session.last_step = "ALERT_ENTER_LOCATION"
-                elif user_input == "3":
-                    response = "CON Enter your advice request:"
-                    db_session.last_step = "GET_ADVICE"
-                elif user_input == "4":
-                    response = "CON Enter your issue type:"
-                    db_session.last_step = "REPORT_ISSUE"
-                elif user_input == "5":
-                    response = """CON Select transport need:
-1. Bicycle
-2. Motorcycle
-3. Van
-4. Lorry"""
-                    db_session.last_step = "REQUEST_TRANSPORT"
-                else:
-                    response = "END Invalid option. Please try again."
-
-        # REGISTRATION flow
-        elif last_step == "REGISTER_NAME":
-            
-            
-            response = "CON Enter your location:"
-            db_session.last_step = "REGISTER_LOCATION"
-
-        elif last_step == "REGISTER_LOCATION":
-            
-            response = "CON Enter your region:"
-            db_session.last_step = "REGISTER_REGION"
-        # user_INPUT is return as 1*Ann Karagwa*Kampala*Central which is split by '*' to get the name, location, and region
-        elif last_step == "REGISTER_REGION":
-            user_input = user_input.strip().split("*") # Split by '*'
-            name = user_input[1].strip() if len(user_input) > 0 else "Unknown" # this user_input[1] is the name
-            location = user_input[2].strip() if len(user_input) > 1 else "Unknown"
-            region = user_input[3].strip() if len(user_input) > 2 else "Unknown"
-            new_farmer = Farmer(
-                name=name,
-                phone=phoneNumber,
-                location=location,
-                region=region # Assuming 'region' column exists in Farmer model
-            )
-            session.add(new_farmer)
-            # No commit here yet. ID will be available after add for current transaction.
-            # session.commit() # Removed
-            # session.refresh(new_farmer) # Removed, not strictly needed before final commit
-
-            # Link the newly created farmer's ID to the USSD session
-            db_session.farmer_id = new_farmer.id
-            response = f"""END Registration successful!
-Name: {name}
-Location: {location}
-Region: {region}
-You can now access full features."""
-            db_session.last_step = "REGISTER_COMPLETE"
-
-        # WEATHER inquiry flow
-        elif last_step in ["FARMER_WEATHER", "GUEST_WEATHER"]:
-            response = "CON Enter the location:"
-            db_session.last_step = "WEATHER_ENTER_LOCATION"
-
-        elif last_step == "WEATHER_ENTER_LOCATION":
-            # user_input is expected to be like 1*1*Kampala
-            user_input=user_input.split("*")
-            option = user_input[1].strip() # Get the weather option selected
-            location = user_input[2].strip() if len(user_input) > 2 else "Unknown" # Use user input location
-            try:
-                response = await format_weather_response(option, location)
-                db_session.last_step = "WEATHER_RESPONSE"
-            except Exception as e:
-                print(f"Weather error: {e}")
-                response = f"END Error fetching weather data. Please try again later. The error is {e}"
-                db_session.last_step = "INITIAL" # Reset on error
-
-        # GET ADVICE flow
-        elif last_step == "GET_ADVICE":
-            # user_input is expected to be like 1*Drought
-            user_input = user_input.strip().split("*") # Split by '*'
-            issue = user_input[1]
-            try:
-                advice_text = await get_ai_advice(user_input=issue, session=session)
-                
-                # session.commit() # Removed, commit at the end
-                response = f"END Advice:\n{advice_text}"
-            except Exception as e:
-                print("AI ERROR:", e)
-                response = "END Sorry, we couldn't get advice right now. Try again later."
-            db_session.last_step = "ADVICE_RESPONSE"
-            
-        # WEATHER ALERTS flow
-        elif last_step == "ALERT_ENTER_LOCATION":
-            location = user_input.strip() # User input is directly the location
-            if not location:
-                response = "END Location cannot be empty for weather alerts. Please try again."
-                db_session.last_step = "INITIAL"
-            else:
-                try:
-                    # Call the dedicated format_alert_response function
-                    response = await format_alert_response(location, session)
-                    db_session.last_step = "ALERT_RESPONSE_FINAL" # A distinct state for final alert response
-                    # No need to clear temp_data here, as only location was captured
-                except Exception as e:
-                    print(f"Alerts error: {traceback.format_exc()}")
-                    response = "END Error fetching weather alerts. Please try again later."
-                    db_session.last_step = "INITIAL"
-            
-
-        # REPORT ISSUE flow
-        elif last_step == "REPORT_ISSUE":
-            # user input is -4*Drought*Crops are drying out so we need to split by '*'
-            
-            response = "CON Enter your issue description:"
-            db_session.last_step = "REPORT_DESCRIPTION"
-
-        elif last_step == "REPORT_DESCRIPTION":
-            user_input = user_input.strip().split("*")
-            issue_type = user_input[1].strip() if len(user_input) > 1 else "Unknown" # this user_input[1] is the issue type
-            description = user_input[2].strip() if len(user_input) > 2 else "No description provided"
-
-            # CRITICAL CHECK: Ensure farmer_id is available before creating FarmerReport
-            if db_session.farmer_id is None:
-                response = "END You must be a registered farmer to report an issue. Please register first."
-                db_session.last_step = "INITIAL" # Reset session
-            else:
-                # Get farmer's location for the report if needed by FarmerReport model
-                current_farmer_location = farmer.location if farmer else "Unknown" # Assuming 'farmer' is still in scope
-
-                new_report = FarmerReport(
-                    farmer_id=db_session.farmer_id,
-                    issue_type=issue_type,    # Matching database column name 'issue_type'
-                    description=description,  # Matching database column name 'description'
-                    location=current_farmer_location, # Adding location based on previous log
-                    status="Pending"          # Explicitly setting status as per previous log
-                )
-                session.add(new_report)
-                # session.commit() # Removed, commit at the end
-                response = f"END Report submitted successfully!\nIssue: {issue_type}\nDescription: {description}"
-                db_session.last_step = "REPORT_COMPLETE"
-
-        # REQUEST TRANSPORT flow
-        elif last_step == "REQUEST_TRANSPORT":
-            
-            transport_map = {
-                "1": "Bicycle",
-                "2": "Motorcycle",
-                "3": "Van",
-                "4": "Lorry"
-            }
-            
-            response = "CON Enter pickup location:"
-            db_session.last_step = "TRANSPORT_PICKUP"
-           
-
-        elif last_step == "TRANSPORT_PICKUP":
-            db_session.temp_data["pickup_location"] = user_input
-            response = "CON Enter delivery location:"
-            db_session.last_step = "TRANSPORT_DELIVERY"
-
-        elif last_step == "TRANSPORT_DELIVERY":
-            user_input = user_input.strip().split("*") # Split by '*'
-            
-            transport_type = user_input[1].strip() if len(user_input) > 1 else db_session.temp_data.get("transport_type", "Unknown")
-            if transport_type is "1":
-                transport_type = "Bicycle"
-            elif transport_type is "2":
-                transport_type = "Motorcycle"
-            elif transport_type is "3":
-                transport_type = "Van"
-            elif transport_type is "4":
-                transport_type = "Lorry"
-            else:
-                transport_type = "Unknown"
-            pickup_location = user_input[2].strip() if len(user_input) > 2 else db_session.temp_data.get("pickup_location", "Unknown")
-            delivery_location = user_input[3].strip() if len(user_input) > 3 else "Unknown"
-
-            # CRITICAL CHECK: Ensure farmer_id is available before creating TransportRequest
-            if db_session.farmer_id is None:
-                response = "END You must be a registered farmer to request transport. Please register first."
-                db_session.last_step = "INITIAL" # Reset session
-            else:
-                new_transport_request = TransportRequest(
-                    farmer_id=db_session.farmer_id,
-                    transport_type=transport_type,  # Matching database column name 'transport_type'
-                    pickup_location=pickup_location,  # Matching database column name 'pickup_location'
-                    dropoff_location=delivery_location,  # Matching database column name 'dropoff_location'
-                    status="Pending"  # Explicitly setting status as per previous log
-                )
-                session.add(new_transport_request)
-                # session.commit() # Removed, commit at the end
-                response = f"END Transport request submitted successfully!\nType: {transport_type}\nPickup: {pickup_location}\nDelivery: {delivery_location}"
-                db_session.last_step = "TRANSPORT_COMPLETE"
-
-        # Fallback for unhandled states or session expiry
+        ctx = USSDContext(path=path, phone_number=phoneNumber, state=db_session, farmer=farmer, db=session, deadline=deadline)
+        if new_session and path.raw:
+            # One-shot dial string (e.g. *384*1*1*Kampala#): skip the menu round trips
+            reply = await menu.dispatch_path(ctx)
         else:
-            response = "END Session expired or invalid state. Please try again."
-            db_session.last_step = "INITIAL" # Reset to initial state
+            reply = await menu.dispatch(ctx)
+        db_session.last_step = reply.next_step
 
         # --- Final session update and commit for the entire request ---
         db_session.updated_at = datetime.utcnow()
-        session.add(db_session) # Ensure db_session is in the session for update
-        session.commit() # Commit all changes made within this request
-        session.refresh(db_session) # Refresh to get any updated auto-generated fields
+        await session.commit() # Commit any farmer/report/transport rows created on this hop
+        for callback in ctx.after_commit:
+            callback()
+
+        # Finished sessions are queued for write-behind persistence; live ones stay in the store
+        if reply.ends_session:
+            db_session.current_step = SESSION_COMPLETED  # Tells the reaper to archive rather than discard it
+            await session_store.finish(db_session)
+        else:
+            await session_store.save(db_session)
 
-        return PlainTextResponse(response)
+        return reply.text
+
+    except Exception:
+        await session.rollback() # Rollback all changes if any error occurs during processing
+        raise
 
-    except Exception as e:
-        session.rollback() # Rollback all changes if any error occurs during processing
-        print(f"An error occurred during USSD callback: {e}")
-        traceback.print_exc() # Print full traceback for detailed debugging
-        return PlainTextResponse("END An unexpected error occurred. Please try again later.")
 
 
 
-    
-async def format_alert_response(location: str, session: Session) -> str:
+async def format_alert_response(location: str) -> str:
     """
-    Fetches and formats active weather alerts for a given location from the database.
+    Fetches and formats active weather alerts for a given location from the in-memory alert index.
     """
-    location_list = location.strip().split("*")
-    location = location_list[1].strip() if len(location_list) > 1 else "Unknown" # Use second part as location
     try:
-        now = datetime.utcnow() # Use UTC for comparison with stored timestamps
-
-        # Query the database for active alerts for the specified location
-        stmt = select(WeatherAlert).where(
-            WeatherAlert.location.ilike(f"%{location}%"), # Case-insensitive search
-            WeatherAlert.effective_time <= now,
-            WeatherAlert.expires_time >= now
-        )
-        
-        
-        result = session.exec(stmt)
-        alerts = result.all() # This should be correct. No await here.
+        alerts = await active_alerts.active_for(location)
 
         if not alerts:
             return f"END No active weather alerts found for {location}."
-        
+
         alert_messages = []
         alert_messages.append(f"END Active Weather Alerts for {location}:")
-        
+
         for alert in alerts:
             alert_messages.append(
                 f"- {alert.alert_type} ({alert.severity}): {alert.alert_message}"
                 f"\n  Valid: {alert.effective_time.strftime('%b %d %H:%M UTC')} - {alert.expires_time.strftime('%b %d %H:%M UTC')}"
             )
-        
+
         return "\n".join(alert_messages)
 
     except Exception as e:
         print(f"Error fetching alerts from database in format_alert_response: {traceback.format_exc()}")
-        return f"END Failed to retrieve weather alerts. Please try again later.{traceback.format_exc()}"
\ No newline at end of file
+        return f"END Failed to retrieve weather alerts. Please try again later.{traceback.format_exc()}"
@@ -1,13 +1,17 @@
 # app/routes/weather_routes.py
 
-from typing import List
-from fastapi import APIRouter, Depends
+from datetime import datetime, timedelta, timezone
+from typing import Annotated, List, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlmodel import Session
 from sqlmodel import select
 
 from ..models import WeatherData
-from ..database import SessionDep, get_session
-from ..services.weather import get_current_weather_data, get_5day_3hour_forecast_raw
+from ..database import AsyncSessionDep, SessionDep, get_session
+from ..schemas import WeatherBatchRequest
+from ..services.weather import get_coordinates, get_current_weather_data, get_5day_3hour_forecast_raw, get_forecast_summary, get_weather_batch, weather_cell
+from ..services.weather_history import cell_location, query_history
+from ..utils.quota import PRIORITY_BACKGROUND, call_priority
 
 router = APIRouter(prefix="/weather", tags=["Weather"])
 
@@ -16,14 +20,72 @@ async def current_weather(location: str):
     return await get_current_weather_data(location)
 
 @router.get("/forecast")
-async def forecast(location: str, days: int = 3):
-    return await get_5day_3hour_forecast_raw(location, days)
+async def forecast(location: str, days: int = Query(3, ge=1, le=5)):
+    raw_forecast = await get_5day_3hour_forecast_raw(location)
+    # The payload is shared with the weather cache, so trim a copy: 8 three-hour entries per day
+    return {**raw_forecast, "list": raw_forecast.get("list", [])[:days * 8]}
+
+@router.get("/forecast/summary")
+async def forecast_summary(location: str):
+    """Daily min/max temperature, total rain and dominant condition for the next 5 days."""
+    return (await get_forecast_summary(location))["json"]
+
+@router.post("/batch")
+async def weather_batch(request: WeatherBatchRequest):
+    """
+    Current weather (or daily forecast summaries) for up to 100 locations in one request.
+    Locations that fail are listed under "errors" with their status code; the rest still return.
+    """
+    with call_priority(PRIORITY_BACKGROUND):  # Dashboard traffic yields OpenWeather quota to USSD and single lookups
+        return await get_weather_batch(request.locations, request.kind)
 
 # @router.post("/alert")
 # async def weather_alert(location: str, db: Session = Depends(get_session)):
 #     return await get_weather_alert(location, db)
 
+def _as_utc(value: datetime) -> datetime:
+    # Observations are stored as naive UTC
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
 @router.get("/weather")
-def read_weather_data(session: SessionDep) -> List[WeatherData]:
-    return session.exec(select(WeatherData)).all() #type: ignore
+async def read_weather_data(
+    session: AsyncSessionDep,
+    location: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: Literal["raw", "hour", "day"] = "raw",
+    offset: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+):
+    """
+    Recorded weather observations for a location between `start` and `end` (UTC, default:
+    the last 7 days), oldest first. `resolution=hour|day` returns one summary row per bucket.
+    Without a location, returns the stored WeatherData rows as a plain list, as before,
+    one page (`offset`/`limit`) at a time.
+    """
+    if location is None:
+        rows = await session.exec(select(WeatherData).order_by(WeatherData.id).offset(offset).limit(limit))
+        return rows.all()
+
+    end = _as_utc(end) if end else datetime.utcnow()
+    start = _as_utc(start) if start else end - timedelta(days=7)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+
+    coords = await get_coordinates(location)
+    if not coords:
+        raise HTTPException(status_code=404, detail=f"Location '{location}' not found in Uganda or coordinates could not be retrieved.")
+    cell = cell_location(*weather_cell(coords))
+
+    items = await query_history(session, cell, start, end, resolution, offset, limit)
+    return {
+        "location": location,
+        "cell": cell,
+        "start": start,
+        "end": end,
+        "resolution": resolution,
+        "offset": offset,
+        "limit": limit,
+        "items": items,
+    }
 
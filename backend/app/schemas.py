@@ -1,6 +1,8 @@
 from datetime import datetime
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import List, Literal, Optional
+
+from pydantic import Field
 
 from enum import Enum
 
@@ -80,6 +82,10 @@ class AdminCreate(BaseModel):
     email: EmailStr
     password: str
     
+class WeatherBatchRequest(BaseModel):
+    locations: List[str] = Field(..., min_length=1, max_length=100)
+    kind: Literal["current", "forecast_summary"] = "current"
+
 class SMSRequest(BaseModel):
     to: str
     message: str
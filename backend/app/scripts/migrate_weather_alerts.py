@@ -0,0 +1,40 @@
+from sqlalchemy import inspect, text
+from sqlmodel import Session, select
+
+from app.database import engine
+from app.models import WeatherAlert
+from app.services.alert_index import alert_location_key
+
+
+def migrate_weather_alerts():
+    """
+    Add and backfill WeatherAlert.location_key and its (location_key, effective_time, expires_time)
+    index. Safe to run repeatedly; also run on app startup since create_all() doesn't alter tables.
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table("weatheralert"):
+        print("weatheralert table not found; it will be created with the new schema.")
+        return
+
+    columns = [column["name"] for column in inspector.get_columns("weatheralert")]
+    with Session(engine) as session:
+        if "location_key" not in columns:
+            print("Adding location_key column to weatheralert table...")
+            session.exec(text("ALTER TABLE weatheralert ADD COLUMN location_key VARCHAR NOT NULL DEFAULT ''"))
+            session.commit()
+
+        alerts = session.exec(select(WeatherAlert).where(WeatherAlert.location_key == "")).all()
+        for alert in alerts:
+            alert.location_key = alert_location_key(alert.location)
+            session.add(alert)
+        session.commit()
+        if alerts:
+            print(f"Backfilled location_key for {len(alerts)} weather alerts.")
+
+    for index in WeatherAlert.__table__.indexes:
+        index.create(engine, checkfirst=True)
+
+
+if __name__ == "__main__":
+    migrate_weather_alerts()
+    print("Migration completed successfully!")
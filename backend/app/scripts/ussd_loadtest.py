@@ -0,0 +1,264 @@
+"""
+USSD traffic simulator and load-test harness.
+
+Replays Africa's Talking style form posts against the FastAPI app in-process (no
+network, no uvicorn): either synthetic multi-hop flows - registration, weather,
+alerts, advice, reports and transport, with the `text` field accumulating the way the
+gateway sends it - or a captured traffic file. Weather, Bedrock and SMS are replaced
+by stubs with a configurable latency so runs are repeatable and cost nothing.
+
+Run it through manage.py:
+
+    python manage.py ussd-loadtest --sessions 500 --concurrency 50
+    python manage.py ussd-loadtest --replay traffic.jsonl
+
+A traffic file has one JSON object per line with the form fields of a hop:
+{"sessionId": "...", "phoneNumber": "...", "text": "...", "serviceCode": "*384#"}.
+Hops are replayed in file order within a session; sessions run concurrently.
+"""
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+SERVICE_CODE = "*384#"
+LOCATIONS = ["Kampala", "Gulu", "Mbarara", "Lira", "Jinja", "Mbale", "Arua", "Masaka", "Hoima", "Soroti"]
+REGIONS = ["Central", "Northern", "Western", "Eastern"]
+ISSUES = [("Pests", "Fall armyworm on maize"), ("Drought", "Beans are drying out"), ("Disease", "Cassava leaves curling")]
+QUESTIONS = ["How do I control fall armyworm", "When should I plant beans", "How to store maize after harvest"]
+
+# Flow name -> relative weight in the synthetic traffic mix
+FLOW_WEIGHTS = {
+    "weather": 35,
+    "guest_weather": 10,
+    "alerts": 15,
+    "advice": 10,
+    "report": 10,
+    "transport": 10,
+    "registration": 10,
+}
+
+
+def _accumulate(answers: List[str]) -> List[str]:
+    """The gateway sends every answer so far joined by '*': ['', '1', '1*2', '1*2*Gulu', ...]."""
+    return [""] + ["*".join(answers[:i]) for i in range(1, len(answers) + 1)]
+
+
+def build_flow(flow: str, rng: random.Random) -> List[str]:
+    location = rng.choice(LOCATIONS)
+    if flow == "weather":
+        return _accumulate(["1", rng.choice(["1", "2"]), location])
+    if flow == "guest_weather":
+        return _accumulate(["2", rng.choice(["1", "2"]), location])
+    if flow == "alerts":
+        return _accumulate(["2", location])
+    if flow == "advice":
+        return _accumulate(["3", rng.choice(QUESTIONS)])
+    if flow == "report":
+        issue_type, description = rng.choice(ISSUES)
+        return _accumulate(["4", issue_type, description])
+    if flow == "transport":
+        return _accumulate(["5", rng.choice(["1", "2", "3", "4"]), location, rng.choice(LOCATIONS)])
+    if flow == "registration":
+        return _accumulate(["1", f"Farmer {rng.randint(1, 99999)}", location, rng.choice(REGIONS)])
+    raise ValueError(f"Unknown flow '{flow}'")
+
+
+def synthetic_traffic(sessions: int, farmers: List[str], seed: int) -> List[List[Dict[str, str]]]:
+    """Generate `sessions` sessions, each a list of hops (form posts)."""
+    rng = random.Random(seed)
+    flows, weights = zip(*FLOW_WEIGHTS.items())
+    traffic = []
+    for n in range(sessions):
+        flow = rng.choices(flows, weights)[0]
+        # Registration and guest flows come from unregistered numbers, everything else from farmers
+        if flow in ("registration", "guest_weather"):
+            phone = f"+2567{rng.randint(10_000_000, 99_999_999)}"
+        else:
+            phone = rng.choice(farmers)
+        session_id = f"loadtest-{seed}-{n}"
+        traffic.append([
+            {"sessionId": session_id, "serviceCode": SERVICE_CODE, "phoneNumber": phone, "text": text}
+            for text in build_flow(flow, rng)
+        ])
+    return traffic
+
+
+def load_traffic(path: Path) -> List[List[Dict[str, str]]]:
+    """Read a captured traffic file, grouping hops by session in file order."""
+    sessions: Dict[str, List[Dict[str, str]]] = defaultdict(list)
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            hop = json.loads(line)
+            sessions[hop["sessionId"]].append({
+                "sessionId": hop["sessionId"],
+                "serviceCode": hop.get("serviceCode", SERVICE_CODE),
+                "phoneNumber": hop["phoneNumber"],
+                "text": hop.get("text", ""),
+            })
+    return list(sessions.values())
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def _fake_current(lat: float, lon: float) -> dict:
+    return {
+        "name": "Stubville", "dt": int(time.time()), "coord": {"lat": lat, "lon": lon},
+        "main": {"temp": 24.5, "humidity": 70}, "weather": [{"id": 500, "main": "Rain", "description": "light rain"}],
+        "rain": {"1h": 0.4}, "wind": {"speed": 2.1},
+    }
+
+
+def _fake_forecast() -> dict:
+    start = int(time.time()) // 10800 * 10800
+    entries = []
+    for i in range(40):
+        dt = start + i * 10800
+        entries.append({
+            "dt": dt, "dt_txt": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(dt)),
+            "main": {"temp": 18 + (i % 8), "humidity": 65}, "weather": [{"id": 500, "main": "Rain", "description": "light rain"}],
+            "rain": {"3h": 1.2 if i % 3 == 0 else 0.0}, "wind": {"speed": 2.0},
+        })
+    return {"list": entries, "city": {"name": "Stubville", "timezone": 10800}}
+
+
+def install_stubs(upstream_latency: float) -> None:
+    """Replace OpenWeather, Bedrock and SMS with local stubs that sleep for `upstream_latency` seconds."""
+    import app.services.ussd_deadline as ussd_deadline
+    import app.services.weather as weather
+    from app.utils.AI_support import advice_pool
+
+    async def fake_fetch_json(url: str, *args, **kwargs):
+        await asyncio.sleep(upstream_latency)
+        if "/geo/" in url:
+            return [{"name": "Stubville", "lat": 0.35, "lon": 32.6, "country": "UG"}]
+        if "/forecast" in url:
+            return _fake_forecast()
+        return _fake_current(0.35, 32.6)
+
+    def fake_advice(query: str) -> str:
+        time.sleep(upstream_latency)
+        return f"Stub advice for: {query[:40]}"
+
+    async def fake_sms(phone_numbers, message):
+        await asyncio.sleep(upstream_latency)
+        return {"SMSMessageData": {"Recipients": [{"number": n, "status": "Success"} for n in phone_numbers]}}
+
+    weather._fetch_json = fake_fetch_json
+    advice_pool._generate = fake_advice
+    ussd_deadline.deliver_sms = fake_sms
+
+
+def seed_farmers(count: int, seed: int) -> List[str]:
+    from sqlmodel import Session, select
+    from app.database import create_db_and_tables, engine
+    from app.models import Farmer
+
+    create_db_and_tables()
+    rng = random.Random(seed)
+    phones = [f"+2567000{n:05d}" for n in range(count)]
+    with Session(engine) as session:
+        existing = set(session.exec(select(Farmer.phone).where(Farmer.phone.in_(phones))).all())
+        for phone in phones:
+            if phone not in existing:
+                session.add(Farmer(name=f"Load Farmer {phone[-5:]}", phone=phone,
+                                   location=rng.choice(LOCATIONS), region=rng.choice(REGIONS)))
+        session.commit()
+    return phones
+
+
+async def _run(traffic: List[List[Dict[str, str]]], concurrency: int) -> Tuple[Dict[str, List[float]], Dict[str, int], float]:
+    import httpx
+    from app.database import async_engine
+    from app.main import app
+    from app.services.ussd_sessions import session_store
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def play_session(client: httpx.AsyncClient, hops: List[Dict[str, str]]) -> None:
+        async with semaphore:
+            for hop in hops:
+                # Label each hop with the state it is dispatched to (peek, so the session
+                # store's hit rate reflects only the handler's own lookups)
+                state = await session_store.peek(hop["sessionId"])
+                label = state.last_step if state else "INITIAL"
+                started = time.perf_counter()
+                try:
+                    response = await client.post("/ussd", data=hop)
+                    failed = response.status_code != 200 or "unexpected error" in response.text
+                except Exception:
+                    failed = True
+                latencies[label].append(time.perf_counter() - started)
+                if failed:
+                    errors[label] += 1
+
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+            started = time.perf_counter()
+            await asyncio.gather(*(play_session(client, hops) for hops in traffic))
+            elapsed = time.perf_counter() - started
+    finally:
+        await app.router.shutdown()
+        await async_engine.dispose()
+    return latencies, errors, elapsed
+
+
+def report(latencies: Dict[str, List[float]], errors: Dict[str, int], elapsed: float) -> None:
+    total = sum(len(values) for values in latencies.values())
+    print(f"\n{'state':<24}{'hops':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    all_values = []
+    for state in sorted(latencies, key=lambda s: -len(latencies[s])):
+        values = sorted(latencies[state])
+        all_values.extend(values)
+        print(f"{state:<24}{len(values):>8}{errors.get(state, 0):>8}"
+              f"{_percentile(values, 50) * 1000:>10.2f}{_percentile(values, 95) * 1000:>10.2f}"
+              f"{_percentile(values, 99) * 1000:>10.2f}{values[-1] * 1000:>10.2f}")
+    all_values.sort()
+    print(f"{'ALL':<24}{total:>8}{sum(errors.values()):>8}"
+          f"{_percentile(all_values, 50) * 1000:>10.2f}{_percentile(all_values, 95) * 1000:>10.2f}"
+          f"{_percentile(all_values, 99) * 1000:>10.2f}{(all_values[-1] * 1000 if all_values else 0):>10.2f}")
+    print(f"\n{total} hops in {elapsed:.2f}s = {total / elapsed if elapsed else 0:.1f} hops/sec")
+
+
+def run_loadtest(
+    sessions: int = 200,
+    concurrency: int = 20,
+    farmers: int = 100,
+    replay: Optional[Path] = None,
+    upstream_latency_ms: float = 50,
+    database_url: Optional[str] = None,
+    seed: int = 42,
+) -> None:
+    # Configure the app before it is imported: a throwaway database, quiet SQL logging
+    # and placeholder credentials (nothing real is called, every upstream is stubbed).
+    if database_url is None:
+        database_url = f"sqlite:///{Path(tempfile.mkdtemp(prefix='chapfarm-loadtest-')) / 'loadtest.db'}"
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("SQL_ECHO", "false")
+    os.environ.setdefault("OPENWEATHER_API_KEY", "loadtest")
+    os.environ.setdefault("AFRICASTALKING_API_KEY", "loadtest")
+
+    install_stubs(upstream_latency_ms / 1000)
+    phones = seed_farmers(farmers, seed)
+    traffic = load_traffic(replay) if replay else synthetic_traffic(sessions, phones, seed)
+    print(f"Replaying {len(traffic)} sessions ({sum(len(s) for s in traffic)} hops) "
+          f"at concurrency {concurrency} against {database_url}")
+
+    latencies, errors, elapsed = asyncio.run(_run(traffic, concurrency))
+    report(latencies, errors, elapsed)
@@ -0,0 +1,127 @@
+"""
+Bounded worker pool for AI advice generation.
+
+Bedrock calls take seconds, so they are queued and processed by a fixed number of
+workers instead of running inline in request handlers. The queue is bounded: when it
+is full, `submit()` raises `AdviceQueueFull` so callers can shed load instead of
+piling up requests behind a slow model. Each answer is stored as an `Advice` row
+before the caller's future resolves; if that insert fails the failure is logged and the
+caller still gets the answer.
+"""
+import asyncio
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.database import async_engine
+from app.models import Advice
+
+ADVICE_WORKERS = int(os.getenv("ADVICE_WORKERS", 4))
+ADVICE_QUEUE_SIZE = int(os.getenv("ADVICE_QUEUE_SIZE", 100))
+
+
+class AdviceQueueFull(Exception):
+    """Raised when the advice queue is at capacity."""
+
+
+class AdviceWorkerPool:
+    def __init__(self, generate: Callable[[str], str], workers: int = ADVICE_WORKERS, maxsize: int = ADVICE_QUEUE_SIZE,
+                 on_stored: Optional[Callable[[str, str], None]] = None):
+        self._generate = generate  # Blocking model call, run in a worker thread
+        self._on_stored = on_stored  # Called with (query, answer) once an answer is saved
+        self.workers = workers
+        self.maxsize = maxsize
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._stopped = False
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.store_failed = 0  # Answers returned but not saved
+        self.rejected = 0
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._stopped = False
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        self._stopped = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Fail anything still queued so no caller waits forever (workers fail the ones in flight)
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(AdviceQueueFull("Advice service is shutting down"))
+
+    def submit(self, query: str) -> "asyncio.Future[str]":
+        """Queue a query and return a future for its answer."""
+        if self._stopped:
+            self.rejected += 1
+            raise AdviceQueueFull("Advice service is shutting down")
+        if not self._tasks:
+            self.start()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((query, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise AdviceQueueFull(f"Advice queue is full ({self.maxsize} pending requests)")
+        return future
+
+    async def ask(self, query: str) -> str:
+        return await self.submit(query)
+
+    async def _worker(self) -> None:
+        while True:
+            query, future = await self._queue.get()
+            self.in_flight += 1
+            try:
+                answer = await asyncio.to_thread(self._generate, query)
+                try:
+                    await self._store(query, answer)
+                except Exception as e:
+                    # The answer is still good; only the reuse cache misses out
+                    self.store_failed += 1
+                    print(f"Failed to save advice for '{query}': {e}")
+                self.completed += 1
+                if not future.done():
+                    future.set_result(answer)
+            except asyncio.CancelledError:
+                # The pool is stopping mid-answer
+                if not future.done():
+                    future.set_exception(AdviceQueueFull("Advice service is shutting down"))
+                raise
+            except Exception as e:
+                self.failed += 1
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self.in_flight -= 1
+                self._queue.task_done()
+
+    async def _store(self, query: str, answer: str) -> None:
+        # Save the AI-generated advice to DB for future reference
+        async with AsyncSession(async_engine) as session:
+            session.add(Advice(query_text=query, response_text=answer))
+            await session.commit()
+        if self._on_stored is not None:
+            self._on_stored(query, answer)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "queue_capacity": self.maxsize,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "store_failed": self.store_failed,
+            "rejected": self.rejected,
+        }
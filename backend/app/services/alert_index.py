@@ -0,0 +1,107 @@
+"""
+In-memory index of current weather alerts.
+
+Alerts that haven't expired are loaded once and grouped by normalized location key, so
+the USSD "View Weather Alerts" hop is a dictionary lookup plus a check of each alert's
+effective/expires interval, instead of a query. The index is reloaded whenever alerts are
+generated, and at most ALERT_INDEX_TTL seconds after the last load so that alerts written
+by another process (e.g. `manage.py generate-alerts`) show up too; hops that find the
+index stale at the same moment share one reload.
+
+A location sees the alerts stored under its own key only: "Kampala Central" doesn't get
+"Kampala" alerts, as it did with the old substring match on WeatherAlert.location.
+"""
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.database import async_engine, engine
+from app.models import WeatherAlert
+from app.services.gazetteer import gazetteer, normalize_place_name
+from app.utils.singleflight import SingleFlight
+
+ALERT_INDEX_TTL = float(os.getenv("ALERT_INDEX_TTL", 300))
+
+
+def alert_location_key(location: str) -> str:
+    """Key alerts and lookups by the gazetteer's spelling of a place when it knows it."""
+    place = gazetteer.lookup(location, count=False)  # Not a geocoding lookup, so kept out of the gazetteer's stats
+    return normalize_place_name(place.name if place else location)
+
+
+@dataclass(frozen=True)
+class ActiveAlert:
+    alert_type: str
+    severity: str
+    alert_message: str
+    effective_time: datetime
+    expires_time: datetime
+
+    @classmethod
+    def from_row(cls, row: WeatherAlert) -> "ActiveAlert":
+        return cls(alert_type=row.alert_type, severity=row.severity, alert_message=row.alert_message,
+                   effective_time=row.effective_time, expires_time=row.expires_time)
+
+    def active_at(self, moment: datetime) -> bool:
+        return self.effective_time <= moment < self.expires_time
+
+
+class ActiveAlertIndex:
+    """Unexpired alerts (current and upcoming) by location key."""
+
+    def __init__(self, ttl: float = ALERT_INDEX_TTL):
+        self.ttl = ttl
+        self._alerts: Dict[str, List[ActiveAlert]] = {}
+        self._loaded_at: Optional[float] = None
+        self._reloads: SingleFlight[None] = SingleFlight()
+        self.lookups = 0
+        self.reloads = 0
+
+    @staticmethod
+    def _statement(now: datetime):
+        return select(WeatherAlert).where(WeatherAlert.expires_time > now).order_by(WeatherAlert.effective_time)
+
+    def _build(self, rows: Iterable[WeatherAlert]) -> None:
+        alerts: Dict[str, List[ActiveAlert]] = {}
+        for row in rows:
+            alerts.setdefault(row.location_key or alert_location_key(row.location), []).append(ActiveAlert.from_row(row))
+        self._alerts = alerts
+        self._loaded_at = time.monotonic()
+        self.reloads += 1
+
+    def load(self) -> None:
+        """Build the index from the database (called on app startup)."""
+        with Session(engine) as session:
+            self._build(session.exec(self._statement(datetime.utcnow())).all())
+
+    async def refresh(self) -> None:
+        async with AsyncSession(async_engine) as session:
+            self._build((await session.exec(self._statement(datetime.utcnow()))).all())
+
+    async def active_for(self, location: str, now: Optional[datetime] = None) -> List[ActiveAlert]:
+        """Alerts in effect for `location` right now, oldest first."""
+        now = now or datetime.utcnow()
+        if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl:
+            await self._reloads.do("refresh", self.refresh)  # Also drops alerts that expired since the last load
+        self.lookups += 1
+        return [alert for alert in self._alerts.get(alert_location_key(location), ()) if alert.active_at(now)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "locations": len(self._alerts),
+            "alerts": sum(len(alerts) for alerts in self._alerts.values()),
+            "lookups": self.lookups,
+            "reloads": self.reloads,
+        }
+
+
+active_alerts = ActiveAlertIndex()
+
+
+def load_active_alerts() -> None:
+    active_alerts.load()
@@ -0,0 +1,68 @@
+"""
+Phone number -> farmer lookup cache for the USSD hot path.
+
+A farmer's identity does not change between hops, so the USSD handler resolves the
+caller through this cache instead of querying the Farmer table on every hop. Unknown
+numbers are cached too (as "not registered") so guests don't cost a query per hop
+either. Any code that creates, updates or deletes a Farmer must call `invalidate()`.
+
+The cache is per process; FARMER_CACHE_TTL bounds how long another worker's change
+can go unnoticed.
+"""
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models import Farmer
+from app.utils.cache import TTLCache
+
+FARMER_CACHE_SIZE = int(os.getenv("FARMER_CACHE_SIZE", 20000))
+FARMER_CACHE_TTL = float(os.getenv("FARMER_CACHE_TTL", 600))
+
+_NOT_REGISTERED = object()
+
+
+@dataclass(frozen=True)
+class FarmerProfile:
+    """The slice of a Farmer row the USSD menus need."""
+    id: int
+    name: str
+    phone: str
+    location: str
+    region: str
+
+    @classmethod
+    def from_farmer(cls, farmer: Farmer) -> "FarmerProfile":
+        return cls(id=farmer.id, name=farmer.name, phone=farmer.phone, location=farmer.location, region=farmer.region)
+
+
+class FarmerCache:
+    def __init__(self, maxsize: int = FARMER_CACHE_SIZE, ttl: float = FARMER_CACHE_TTL):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def lookup(self, session: AsyncSession, phone: str) -> Optional[FarmerProfile]:
+        """Return the farmer registered with `phone`, querying the database only on a cache miss."""
+        cached = self._cache.get(phone)
+        if cached is not None:
+            return None if cached is _NOT_REGISTERED else cached
+
+        farmer = (await session.exec(select(Farmer).where(Farmer.phone == phone))).first()
+        profile = FarmerProfile.from_farmer(farmer) if farmer else None
+        self._cache.set(phone, profile or _NOT_REGISTERED)
+        return profile
+
+    def invalidate(self, phone: Optional[str]) -> None:
+        if phone:
+            self._cache.pop(phone)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+
+farmer_cache = FarmerCache()
@@ -0,0 +1,169 @@
+"""
+Daily forecast SMS digest.
+
+Every morning each registered farmer gets the forecast by SMS, so they don't have to
+dial in for it. Farmers are grouped by weather cell (neighbouring villages share one),
+one forecast is fetched and one message rendered per cell, and the message is sent to
+the cell's farmers in batches of FORECAST_DIGEST_BATCH numbers per gateway request.
+
+Sent at FORECAST_DIGEST_HOUR (Uganda time) when set - enable it on a single worker only,
+or schedule `python manage.py send-forecast-digest` instead.
+"""
+import asyncio
+import os
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.database import async_engine
+from app.models import Farmer
+from app.routes.sms import deliver_sms
+from app.services.forecast_summary import summarize_forecast
+from app.services.gazetteer import UGANDA_UTC_OFFSET
+from app.services.weather import get_cell_forecast, get_coordinates, weather_cell
+from app.utils.quota import PRIORITY_BACKGROUND, call_priority
+
+FORECAST_DIGEST_HOUR = os.getenv("FORECAST_DIGEST_HOUR", "").strip()  # local hour (0-23); empty disables the schedule
+FORECAST_DIGEST_DAYS = int(os.getenv("FORECAST_DIGEST_DAYS", 2))  # days covered by each message
+FORECAST_DIGEST_BATCH = int(os.getenv("FORECAST_DIGEST_BATCH", 100))  # phone numbers per SMS gateway request
+
+
+@dataclass
+class DigestCell:
+    lat: float
+    lon: float
+    phones: Set[str] = field(default_factory=set)
+    names: Counter = field(default_factory=Counter)  # Farmer locations in the cell, by count
+
+    @property
+    def name(self) -> str:
+        return self.names.most_common(1)[0][0]
+
+
+@dataclass
+class DigestResult:
+    farmers: int = 0
+    cells: int = 0
+    unresolved: int = 0  # Farmers whose location couldn't be placed
+    requests: int = 0  # SMS gateway requests made
+    sent: int = 0  # Recipients in successful requests
+    failed: int = 0  # Recipients in failed requests, or in cells without a forecast
+    seconds: float = 0.0
+
+
+last_digest: Optional[DigestResult] = None
+
+
+async def digest_cells(result: DigestResult) -> List[DigestCell]:
+    """Group farmers' phone numbers by weather cell. Each distinct location is resolved once."""
+    async with AsyncSession(async_engine) as session:
+        rows = (await session.exec(select(Farmer.phone, Farmer.location, Farmer.region))).all()
+    result.farmers = len(rows)
+
+    cells: Dict[Tuple[float, float], DigestCell] = {}
+    resolved: Dict[str, Optional[Tuple[float, float]]] = {}
+    for phone, location, region in rows:
+        name = (location or region or "").strip()
+        if name not in resolved:
+            coords = None
+            if name:
+                try:
+                    coords = await get_coordinates(name)
+                except Exception as e:
+                    print(f"Forecast digest could not resolve '{name}': {getattr(e, 'detail', e)}")
+            resolved[name] = weather_cell(coords) if coords else None
+        key = resolved[name]
+        if key is None or not phone:
+            result.unresolved += 1
+            continue
+        cell = cells.setdefault(key, DigestCell(lat=key[0], lon=key[1]))
+        cell.phones.add(phone)
+        cell.names[name] += 1
+    result.cells = len(cells)
+    return list(cells.values())
+
+
+async def send_forecast_digest(batch_size: int = FORECAST_DIGEST_BATCH, days: int = FORECAST_DIGEST_DAYS,
+                               dry_run: bool = False) -> DigestResult:
+    """Fetch one forecast per cell and SMS it to the cell's farmers (or just print the messages with dry_run)."""
+    global last_digest
+    started = time.monotonic()
+    result = DigestResult()
+
+    with call_priority(PRIORITY_BACKGROUND):
+        for cell in await digest_cells(result):
+            try:
+                payload = await get_cell_forecast(cell.lat, cell.lon)
+            except Exception as e:
+                print(f"Forecast digest has no forecast for {cell.name}: {getattr(e, 'detail', e)}")
+                result.failed += len(cell.phones)
+                continue
+            message = summarize_forecast(payload, cell.name).sms_text(days)
+            if dry_run:
+                print(f"[{len(cell.phones)} farmers] {message}")
+                continue
+
+            phones = sorted(cell.phones)
+            for start in range(0, len(phones), batch_size):
+                batch = phones[start:start + batch_size]
+                result.requests += 1
+                try:
+                    await deliver_sms(batch, message)
+                    result.sent += len(batch)
+                except Exception as e:
+                    result.failed += len(batch)
+                    print(f"Forecast digest SMS failed for {len(batch)} farmers in {cell.name}: {e}")
+
+    result.seconds = round(time.monotonic() - started, 3)
+    if not dry_run:
+        last_digest = result
+    return result
+
+
+def digest_stats() -> Dict[str, Any]:
+    return {
+        "hour": FORECAST_DIGEST_HOUR or None,
+        "last_run": asdict(last_digest) if last_digest else None,
+    }
+
+
+def seconds_until(hour: int, now: Optional[datetime] = None) -> float:
+    """Seconds from `now` (UTC) until the next `hour` o'clock Uganda time."""
+    now = now or datetime.utcnow()
+    local = now + timedelta(seconds=UGANDA_UTC_OFFSET)
+    target = local.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if target <= local:
+        target += timedelta(days=1)
+    return (target - local).total_seconds()
+
+
+_digest_task: Optional[asyncio.Task] = None
+
+
+async def _digest_loop(hour: int):
+    while True:
+        await asyncio.sleep(seconds_until(hour))
+        try:
+            result = await send_forecast_digest()
+            print(f"Forecast digest: {result.sent} farmers in {result.cells} cells via {result.requests} SMS requests, "
+                  f"{result.failed} failed, {result.unresolved} unresolved in {result.seconds}s")
+        except Exception as e:
+            print(f"Forecast digest failed: {e}")
+
+
+def start_forecast_digest() -> None:
+    global _digest_task
+    if _digest_task is None and FORECAST_DIGEST_HOUR:
+        _digest_task = asyncio.create_task(_digest_loop(int(FORECAST_DIGEST_HOUR)))
+
+
+def stop_forecast_digest() -> None:
+    global _digest_task
+    if _digest_task is not None:
+        _digest_task.cancel()
+        _digest_task = None
@@ -0,0 +1,100 @@
+"""
+Daily summaries of the OpenWeather 5-day / 3-hour forecast.
+
+The 40 forecast entries are read once into NumPy arrays and grouped by local calendar
+day, giving each day's minimum and maximum temperature, total rain and most frequent
+condition. Summaries are computed once per cached forecast payload (see
+`WeatherCache.derive`), so repeat requests skip both parsing and formatting.
+"""
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+import numpy as np
+
+SECONDS_PER_DAY = 86400
+DEFAULT_UTC_OFFSET = 10800  # East Africa Time, used when the payload has no city timezone
+
+
+@dataclass(frozen=True)
+class DaySummary:
+    date: str  # Local date, YYYY-MM-DD
+    temp_min: float
+    temp_max: float
+    rain_mm: float
+    condition: str
+
+
+@dataclass(frozen=True)
+class ForecastSummary:
+    location: str
+    days: List[DaySummary]
+
+    def ussd_text(self) -> str:
+        if not self.days:
+            return f"No forecast available for {self.location}."
+        lines = [f"{len(self.days)}-Day Forecast for {self.location}:"]
+        for day in self.days:
+            label = datetime.strptime(day.date, "%Y-%m-%d").strftime("%a %d")
+            lines.append(f"{label}: {day.condition.capitalize()}, {day.temp_min:.0f}-{day.temp_max:.0f}°C, rain {day.rain_mm:.1f}mm")
+        return "\n".join(lines)
+
+    def sms_text(self, max_days: int = 2) -> str:
+        # Plain GSM characters only (no "°"), so the message isn't sent as shorter UCS-2 segments
+        days = "; ".join(
+            f"{datetime.strptime(day.date, '%Y-%m-%d').strftime('%a')}: {day.condition.capitalize()}, "
+            f"{day.temp_min:.0f}-{day.temp_max:.0f}C, rain {day.rain_mm:.1f}mm"
+            for day in self.days[:max_days]
+        )
+        return f"ChapFarm forecast for {self.location}. {days or 'No forecast available.'}"
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"location": self.location, "days": [asdict(day) for day in self.days], "text": self.ussd_text()}
+
+
+def entry_timestamp(entry: Dict[str, Any]) -> int:
+    if "dt" in entry:
+        return int(entry["dt"])
+    # Older payloads only carry dt_txt (UTC)
+    return int(datetime.strptime(entry["dt_txt"], "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp())
+
+
+def summarize_forecast(payload: Dict[str, Any], location: str, max_days: int = 5) -> ForecastSummary:
+    entries = [entry for entry in payload.get("list") or [] if "dt" in entry or "dt_txt" in entry]
+    if not entries:
+        return ForecastSummary(location=location, days=[])
+
+    offset = (payload.get("city") or {}).get("timezone", DEFAULT_UTC_OFFSET)
+    timestamps = np.fromiter((entry_timestamp(entry) for entry in entries), dtype=np.int64, count=len(entries))
+    temps = np.array([(entry.get("main") or {}).get("temp", np.nan) for entry in entries], dtype=float)
+    rain = np.array([(entry.get("rain") or {}).get("3h", 0.0) for entry in entries], dtype=float)
+    conditions = np.array([((entry.get("weather") or [{}])[0]).get("description", "N/A") for entry in entries])
+
+    # Group by local calendar day
+    local_days = (timestamps + offset) // SECONDS_PER_DAY
+    days, day_index = np.unique(local_days, return_inverse=True)
+    n_days = len(days)
+
+    temp_min = np.full(n_days, np.nan)
+    temp_max = np.full(n_days, np.nan)
+    np.fmin.at(temp_min, day_index, temps)  # fmin/fmax skip missing (NaN) temperatures
+    np.fmax.at(temp_max, day_index, temps)
+    rain_total = np.bincount(day_index, weights=rain, minlength=n_days)
+
+    # Dominant condition: the most frequent description of each day
+    condition_names, condition_index = np.unique(conditions, return_inverse=True)
+    counts = np.zeros((n_days, len(condition_names)), dtype=np.int64)
+    np.add.at(counts, (day_index, condition_index), 1)
+    dominant = condition_names[counts.argmax(axis=1)]
+
+    summaries = [
+        DaySummary(
+            date=datetime.fromtimestamp(int(day) * SECONDS_PER_DAY, tz=timezone.utc).strftime("%Y-%m-%d"),
+            temp_min=round(float(temp_min[i]), 1),
+            temp_max=round(float(temp_max[i]), 1),
+            rain_mm=round(float(rain_total[i]), 1),
+            condition=str(dominant[i]),
+        )
+        for i, day in enumerate(days[:max_days])
+    ]
+    return ForecastSummary(location=location, days=summaries)
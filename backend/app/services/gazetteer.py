@@ -0,0 +1,175 @@
+"""
+Local gazetteer of Ugandan places.
+
+District and town coordinates never change, so `get_coordinates` resolves names here
+before calling the OpenWeather geocoding API. The bundled list (app/data/uganda_gazetteer.csv)
+holds districts, main towns and Kampala's divisions - not sub-counties - and is seeded into
+the `GazetteerPlace` table on startup; names the API resolves (sub-counties included) are
+added to the same table, so the network is only hit for places we have never seen.
+
+Lookups tolerate the misspellings typed on feature phones ("Kampla", "gullu") through a
+rapidfuzz match against every known name.
+"""
+import csv
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from rapidfuzz import fuzz, process
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.database import async_engine, engine
+from app.models import GazetteerPlace
+from app.utils.cache import TTLCache
+
+GAZETTEER_FILE = Path(__file__).resolve().parent.parent / "data" / "uganda_gazetteer.csv"
+GAZETTEER_MATCH_THRESHOLD = float(os.getenv("GAZETTEER_MATCH_THRESHOLD", 85))  # rapidfuzz score, 0-100
+GAZETTEER_MISS_TTL = float(os.getenv("GAZETTEER_MISS_TTL", 3600))  # how long a name the API couldn't resolve is remembered
+
+UGANDA_UTC_OFFSET = 10800  # East Africa Time, UTC+3, no daylight saving
+
+# Words farmers add around a place name that don't help identify it
+_NOISE_WORDS = {"district", "town", "city", "municipality", "sub", "county", "subcounty", "division", "uganda"}
+
+
+def normalize_place_name(name: str) -> str:
+    words = re.sub(r"[^a-z0-9 ]+", " ", name.lower()).split()
+    return " ".join(word for word in words if word not in _NOISE_WORDS) or " ".join(words)
+
+
+@dataclass(frozen=True)
+class Place:
+    name: str
+    lat: float
+    lon: float
+    kind: str = "geocoded"
+    district: Optional[str] = None
+    region: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row: GazetteerPlace) -> "Place":
+        return cls(name=row.name, lat=row.lat, lon=row.lon, kind=row.kind, district=row.district, region=row.region)
+
+
+class Gazetteer:
+    """In-memory name index over the known places."""
+
+    def __init__(self, threshold: float = GAZETTEER_MATCH_THRESHOLD, miss_ttl: float = GAZETTEER_MISS_TTL):
+        self.threshold = threshold
+        self._places: Dict[str, Place] = {}
+        self._keys: List[str] = []
+        self._unknown: TTLCache[bool] = TTLCache(maxsize=5000, ttl=miss_ttl)
+        self.exact_hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._places)
+
+    def load(self, places: Iterable[Place]) -> None:
+        self._places = {}
+        for place in places:
+            self._places.setdefault(normalize_place_name(place.name), place)
+        self._keys = list(self._places)
+
+    def add(self, place: Place, name: Optional[str] = None) -> None:
+        key = normalize_place_name(name or place.name)
+        if key and key not in self._places:
+            self._places[key] = place
+            self._keys.append(key)
+        self._unknown.pop(key)
+
+    def lookup(self, name: str, count: bool = True) -> Optional[Place]:
+        """The place `name` refers to, if known. `count=False` leaves the hit/miss stats alone."""
+        if not self._places:
+            self.load(load_bundled_places())
+
+        key = normalize_place_name(name)
+        if not key:
+            return None
+        place = self._places.get(key)
+        if place is not None:
+            if count:
+                self.exact_hits += 1
+            return place
+
+        match = process.extractOne(key, self._keys, scorer=fuzz.WRatio, score_cutoff=self.threshold)
+        if match:
+            if count:
+                self.fuzzy_hits += 1
+            return self._places[match[0]]
+
+        if count:
+            self.misses += 1
+        return None
+
+    def mark_unknown(self, name: str) -> None:
+        """Remember that the geocoding API had no Ugandan match for `name` either."""
+        self._unknown.set(normalize_place_name(name), True)
+
+    def is_unknown(self, name: str) -> bool:
+        return normalize_place_name(name) in self._unknown
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.exact_hits + self.fuzzy_hits + self.misses
+        return {
+            "places": len(self._places),
+            "exact_hits": self.exact_hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.exact_hits + self.fuzzy_hits) / lookups, 4) if lookups else 0.0,
+            "known_unknown": len(self._unknown),
+        }
+
+
+gazetteer = Gazetteer()
+
+
+def load_bundled_places(path: Path = GAZETTEER_FILE) -> List[Place]:
+    with open(path, newline="", encoding="utf-8") as f:
+        return [
+            Place(name=row["name"], lat=float(row["lat"]), lon=float(row["lon"]), kind=row["kind"],
+                  district=row["district"] or None, region=row["region"] or None)
+            for row in csv.DictReader(f)
+        ]
+
+
+def seed_gazetteer(session: Session) -> int:
+    """Insert bundled places missing from the GazetteerPlace table. Returns how many were added."""
+    existing = set(session.exec(select(GazetteerPlace.name_key)).all())
+    added = 0
+    for place in load_bundled_places():
+        key = normalize_place_name(place.name)
+        if key in existing:
+            continue
+        existing.add(key)
+        session.add(GazetteerPlace(name=place.name, name_key=key, kind=place.kind, district=place.district,
+                                   region=place.region, lat=place.lat, lon=place.lon))
+        added += 1
+    session.commit()
+    return added
+
+
+def load_gazetteer() -> None:
+    """Seed the table and build the in-memory index (called on app startup)."""
+    with Session(engine) as session:
+        seed_gazetteer(session)
+        gazetteer.load(Place.from_row(row) for row in session.exec(select(GazetteerPlace)).all())
+
+
+async def remember_geocoded_place(name: str, lat: float, lon: float) -> Place:
+    """Persist a name resolved by the geocoding API so it is answered locally from now on."""
+    place = Place(name=name.strip(), lat=lat, lon=lon)
+    gazetteer.add(place)
+    try:
+        async with AsyncSession(async_engine) as session:
+            session.add(GazetteerPlace(name=place.name, name_key=normalize_place_name(name), kind="geocoded",
+                                       lat=lat, lon=lon, source="geocoded"))
+            await session.commit()
+    except Exception as e:
+        # Most likely another worker stored the same name first; the in-memory index is enough
+        print(f"Could not store geocoded place '{name}': {e}")
+    return place
@@ -0,0 +1,74 @@
+"""
+Per-hop latency budget for USSD replies.
+
+Africa's Talking drops a USSD session if we don't answer within a few seconds. Slow
+upstream work (weather lookups, AI advice) is started as a task and given whatever is
+left of the hop's budget; if it isn't done in time the farmer gets an immediate END
+reply and the result is sent by SMS once the task finishes.
+"""
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from app.routes.sms import deliver_sms
+
+USSD_HOP_BUDGET = float(os.getenv("USSD_HOP_BUDGET", 3.0))  # seconds, measured from the start of the hop
+
+DEFERRED_REPLY = "This is taking a little longer. We'll SMS you the answer shortly."
+
+# Strong references to delivery tasks, so they aren't garbage collected mid-flight
+_deliveries: Set[asyncio.Task] = set()
+
+deadline_stats: Dict[str, int] = {"on_time": 0, "deferred": 0, "sms_delivered": 0, "sms_failed": 0}
+
+
+def hop_deadline() -> float:
+    """Monotonic time by which the current hop must be answered."""
+    return time.monotonic() + USSD_HOP_BUDGET
+
+
+def _as_sms(reply_text: str) -> str:
+    """USSD replies carry a CON/END prefix that makes no sense in an SMS."""
+    for prefix in ("END ", "CON "):
+        if reply_text.startswith(prefix):
+            return reply_text[len(prefix):]
+    return reply_text
+
+
+async def _deliver_when_done(task: asyncio.Task, phone_number: str, error_text: str) -> None:
+    try:
+        message = _as_sms(await task)
+    except Exception as e:
+        print(f"Deferred USSD work failed for {phone_number}: {e}")
+        message = error_text
+    try:
+        await deliver_sms([phone_number], message)
+        deadline_stats["sms_delivered"] += 1
+    except Exception as e:
+        deadline_stats["sms_failed"] += 1
+        print(f"Failed to SMS deferred USSD reply to {phone_number}: {e}")
+
+
+async def reply_or_defer(
+    work: Awaitable[str],
+    phone_number: str,
+    deadline: float,
+    error_text: str = "Sorry, we couldn't complete your request. Please try again later.",
+) -> Optional[str]:
+    """
+    Wait for `work` until `deadline`. Returns its reply text if it finished in time
+    (re-raising its exception if it failed), otherwise returns None and delivers the
+    reply - or `error_text` if the work fails - by SMS in the background.
+    """
+    task = asyncio.ensure_future(work)
+    done, _ = await asyncio.wait({task}, timeout=max(deadline - time.monotonic(), 0))
+    if task in done:
+        deadline_stats["on_time"] += 1
+        return task.result()
+
+    deadline_stats["deferred"] += 1
+    delivery = asyncio.create_task(_deliver_when_done(task, phone_number, error_text))
+    _deliveries.add(delivery)
+    delivery.add_done_callback(_deliveries.discard)
+    return None
@@ -0,0 +1,192 @@
+"""
+Table-driven USSD state machine.
+
+Each menu state is registered once with its prompt (the text shown when the state is
+entered), an optional input parser and a handler. A hop is dispatched with a single
+dictionary lookup on the session's `last_step`, and the accumulated Africa's Talking
+`text` (e.g. "1*2*Kampala") is parsed once per hop into a `DialPath`. A new session
+whose first hop already carries answers (a one-shot dial string) is fast-forwarded
+through the same handlers with `dispatch_path`.
+"""
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models import USSDSession
+
+
+@dataclass(frozen=True)
+class DialPath:
+    """The `text` field of a USSD hop, split into the answers given so far."""
+    raw: str
+    parts: Tuple[str, ...]
+
+    @classmethod
+    def parse(cls, text: str) -> "DialPath":
+        text = text.strip()
+        return cls(raw=text, parts=tuple(part.strip() for part in text.split("*")) if text else ())
+
+    def __len__(self) -> int:
+        return len(self.parts)
+
+    @property
+    def latest(self) -> str:
+        """The answer typed on this hop."""
+        return self.parts[-1] if self.parts else ""
+
+    def at(self, index: int, default: str = "") -> str:
+        return self.parts[index] if index < len(self.parts) and self.parts[index] else default
+
+    def prefix(self, length: int) -> "DialPath":
+        """The path as it was after the first `length` answers."""
+        parts = self.parts[:length]
+        return DialPath(raw="*".join(parts), parts=parts)
+
+
+@dataclass
+class USSDContext:
+    """Everything a state handler needs to answer one hop."""
+    path: DialPath
+    phone_number: str
+    state: USSDSession
+    farmer: Optional[Any]
+    db: AsyncSession
+    deadline: float  # time.monotonic() by which this hop must be answered
+    after_commit: List[Callable[[], None]] = field(default_factory=list)  # Run once the hop's writes are committed
+
+
+@dataclass(frozen=True)
+class Reply:
+    text: str
+    next_step: str
+
+    @property
+    def ends_session(self) -> bool:
+        return self.text.startswith("END")
+
+
+def con(text: str, next_step: str) -> Reply:
+    return Reply(f"CON {text}", next_step)
+
+
+def end(text: str, next_step: str) -> Reply:
+    return Reply(f"END {text}", next_step)
+
+
+Handler = Callable[[USSDContext, Any], Awaitable[Reply]]
+
+
+@dataclass
+class MenuState:
+    name: str
+    prompt: Optional[str] = None  # Shown (as CON) when the session enters this state
+    handler: Optional[Handler] = None
+    parser: Optional[Callable[[DialPath], Any]] = None
+    then: Optional[str] = None  # For input-collecting states without a handler: the state to move to
+
+
+@dataclass
+class StateTiming:
+    count: int = 0
+    errors: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    def record(self, elapsed: float, failed: bool = False) -> None:
+        self.count += 1
+        self.errors += failed
+        self.total_seconds += elapsed
+        self.max_seconds = max(self.max_seconds, elapsed)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total_ms": round(self.total_seconds * 1000, 3),
+            "mean_ms": round(self.total_seconds * 1000 / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_seconds * 1000, 3),
+        }
+
+
+class MenuRegistry:
+    """Registry of menu states keyed by the `last_step` value stored on the session."""
+
+    def __init__(self, fallback: Reply):
+        self.fallback = fallback  # Returned for unknown states (expired or corrupted sessions)
+        self.states: Dict[str, MenuState] = {}
+        self.timings: Dict[str, StateTiming] = {}
+
+    def add(self, name: str, prompt: Optional[str] = None, handler: Optional[Handler] = None,
+            parser: Optional[Callable[[DialPath], Any]] = None, then: Optional[str] = None) -> MenuState:
+        if name in self.states:
+            raise ValueError(f"USSD state '{name}' is already registered")
+        if handler is None and then is None:
+            raise ValueError(f"USSD state '{name}' needs either a handler or a 'then' state")
+        menu_state = MenuState(name=name, prompt=prompt, handler=handler, parser=parser, then=then)
+        self.states[name] = menu_state
+        self.timings[name] = StateTiming()
+        return menu_state
+
+    def state(self, *names: str, prompt: Optional[str] = None, parser: Optional[Callable[[DialPath], Any]] = None):
+        """Decorator registering a handler for one or more states."""
+        def decorator(handler: Handler) -> Handler:
+            for name in names:
+                self.add(name, prompt=prompt, handler=handler, parser=parser)
+            return handler
+        return decorator
+
+    def enter(self, name: str) -> Reply:
+        """Move the session into `name`, showing that state's prompt."""
+        prompt = self.states[name].prompt
+        if prompt is None:
+            raise ValueError(f"USSD state '{name}' has no prompt to show")
+        return con(prompt, name)
+
+    def choose(self, choice: str, options: Dict[str, str], invalid: Reply) -> Reply:
+        """Resolve a numbered menu choice to the state it leads to."""
+        next_state = options.get(choice)
+        return self.enter(next_state) if next_state else invalid
+
+    async def dispatch(self, ctx: USSDContext) -> Reply:
+        name = ctx.state.last_step or "INITIAL"
+        menu_state = self.states.get(name)
+        if menu_state is None:
+            return self.fallback
+
+        started = time.perf_counter()
+        failed = True
+        try:
+            if menu_state.handler is None:
+                reply = self.enter(menu_state.then)
+            else:
+                parsed = menu_state.parser(ctx.path) if menu_state.parser else None
+                reply = await menu_state.handler(ctx, parsed)
+            failed = False
+            return reply
+        finally:
+            self.timings[name].record(time.perf_counter() - started, failed)
+
+    async def dispatch_path(self, ctx: USSDContext) -> Reply:
+        """
+        Walk a new session through every answer in `ctx.path` at once.
+
+        A full dial string such as *384*1*1*Kampala# arrives as text "1*1*Kampala" on the
+        first hop. Each prefix ("", "1", "1*1", "1*1*Kampala") is dispatched in turn, exactly
+        as if it had been sent on its own hop, stopping early if a state ends the session.
+        """
+        full_path = ctx.path
+        try:
+            for length in range(len(full_path) + 1):
+                ctx.path = full_path.prefix(length)
+                reply = await self.dispatch(ctx)
+                if reply.ends_session:
+                    break
+                ctx.state.last_step = reply.next_step
+        finally:
+            ctx.path = full_path
+        return reply
+
+    def timing_snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {name: timing.snapshot() for name, timing in self.timings.items() if timing.count}
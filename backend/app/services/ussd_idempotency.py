@@ -0,0 +1,101 @@
+"""
+Idempotent handling of retried USSD hops.
+
+When our reply is slow the gateway re-posts the same hop (same `sessionId` and
+`text`). Processing it again would repeat weather/AI calls and could insert a second
+FarmerReport or TransportRequest, and the session has already moved on so the retry
+would be dispatched to the wrong state anyway. Replies are therefore cached for a
+short time keyed by (sessionId, text); a retry that arrives while the original hop is
+still running waits for that hop's reply instead of starting its own.
+
+With a shared session store (USSD_SESSION_STORE=redis) this holds across workers: the
+worker that first sees a hop claims it in the store and saves its reply there, and a
+retry routed to another worker waits for that reply. With the in-memory store the
+guarantee is per process, like the sessions themselves.
+
+Only successful hops are cached: a hop that raised was rolled back, so a retry may
+safely run it again.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.services.ussd_sessions import USSDSessionStore, session_store
+from app.utils.cache import TTLCache
+from app.utils.singleflight import SingleFlight
+
+USSD_REPLY_CACHE_TTL = float(os.getenv("USSD_REPLY_CACHE_TTL", 60))
+USSD_REPLY_CACHE_SIZE = int(os.getenv("USSD_REPLY_CACHE_SIZE", 10000))
+USSD_HOP_CLAIM_TTL = float(os.getenv("USSD_HOP_CLAIM_TTL", 10))  # longest a worker may hold a hop before others run it
+USSD_HOP_CLAIM_POLL = 0.05  # seconds between checks for another worker's reply
+
+HopKey = Tuple[str, str]
+
+
+class HopReplyCache:
+    def __init__(self, maxsize: int = USSD_REPLY_CACHE_SIZE, ttl: float = USSD_REPLY_CACHE_TTL,
+                 store: Optional[USSDSessionStore] = None, claim_ttl: float = USSD_HOP_CLAIM_TTL):
+        self.ttl = ttl
+        self.claim_ttl = claim_ttl
+        self._store = store  # Shares replies between workers when the store does
+        self._replies: TTLCache[str] = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._flights: SingleFlight[str] = SingleFlight()
+        self.replayed = 0  # Retries answered from the cache
+        self.replayed_shared = 0  # ...with a reply from another worker
+
+    async def _claim_or_reply(self, session_id: str, text: str) -> Optional[str]:
+        """Claim the hop for this worker (None), or return the reply of the worker that holds it."""
+        give_up = time.monotonic() + self.claim_ttl
+        while True:
+            reply = await self._store.get_reply(session_id, text)
+            if reply is not None:
+                return reply
+            if await self._store.claim_hop(session_id, text, self.claim_ttl):
+                return None
+            if time.monotonic() >= give_up:
+                return None  # The claim should have expired by now; run the hop rather than hang
+            await asyncio.sleep(USSD_HOP_CLAIM_POLL)
+
+    async def run(self, session_id: str, text: str, handle: Callable[[], Awaitable[str]]) -> str:
+        """Return the reply for this hop, calling `handle` at most once per (sessionId, text)."""
+        key: HopKey = (session_id, text.strip())
+        cached = self._replies.get(key)
+        if cached is not None:
+            self.replayed += 1
+            return cached
+
+        async def process() -> str:
+            if self._store is not None:
+                reply = await self._claim_or_reply(*key)
+                if reply is not None:
+                    self.replayed += 1
+                    self.replayed_shared += 1
+                    self._replies.set(key, reply)
+                    return reply
+            try:
+                reply = await handle()
+            except BaseException:
+                if self._store is not None:
+                    await self._store.release_hop(*key)
+                raise
+            self._replies.set(key, reply)
+            if self._store is not None:
+                await self._store.save_reply(*key, reply, self.ttl)
+            return reply
+
+        # A retry arriving while the original hop is still running waits for its reply
+        return await self._flights.do(key, process)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "processed": self._flights.calls,
+            "replayed": self.replayed,
+            "replayed_shared": self.replayed_shared,
+            "joined": self._flights.coalesced,
+            "in_flight": self._flights.stats()["in_flight"],
+            "cached": len(self._replies),
+        }
+
+
+hop_replies = HopReplyCache(store=session_store)
@@ -0,0 +1,129 @@
+"""
+USSD session reaper.
+
+The session flusher writes every finished or abandoned session to the `USSDSession`
+table, and nothing ever removed them, so the table and its indexes grew without bound.
+The reaper removes rows that have been idle for USSD_REAPER_IDLE_TTL seconds, in
+batches:
+
+- completed sessions (those that reached an END reply) are copied into the compact
+  `USSDSessionArchive` table (no temp_data) before being deleted,
+- abandoned sessions are simply deleted.
+
+It runs periodically in the background and on demand with
+`python manage.py reap-ussd-sessions`, which can also VACUUM the database afterwards.
+"""
+import asyncio
+import os
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import delete, or_, text
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.database import async_engine, engine
+from app.models import USSDSession, USSDSessionArchive
+from app.services.ussd_sessions import SESSION_COMPLETED
+
+USSD_REAPER_IDLE_TTL = int(os.getenv("USSD_REAPER_IDLE_TTL", 3600))  # seconds since the session's last hop
+USSD_REAPER_INTERVAL = float(os.getenv("USSD_REAPER_INTERVAL", 900))
+USSD_REAPER_BATCH = int(os.getenv("USSD_REAPER_BATCH", 1000))
+
+
+@dataclass
+class ReapResult:
+    archived: int = 0
+    deleted: int = 0  # Abandoned sessions, dropped without archiving
+    started_at: Optional[datetime] = None
+    seconds: float = 0.0
+
+    @property
+    def pruned(self) -> int:
+        return self.archived + self.deleted
+
+
+last_reap: Optional[ReapResult] = None
+
+
+def _archive_row(row: USSDSession) -> USSDSessionArchive:
+    return USSDSessionArchive(
+        session_id=row.session_id,
+        phone_number=row.phone_number,
+        farmer_id=row.farmer_id,
+        final_step=row.last_step,
+        started_at=row.created_at,
+        ended_at=row.updated_at,
+    )
+
+
+async def reap_sessions(idle_ttl: int = USSD_REAPER_IDLE_TTL, batch_size: int = USSD_REAPER_BATCH) -> ReapResult:
+    """Archive completed and delete abandoned sessions idle for longer than `idle_ttl` seconds."""
+    global last_reap
+    result = ReapResult(started_at=datetime.utcnow())
+    cutoff = result.started_at - timedelta(seconds=idle_ttl)
+    idle = or_(
+        USSDSession.updated_at < cutoff,
+        (USSDSession.updated_at == None) & (USSDSession.created_at < cutoff),  # noqa: E711 (SQL IS NULL)
+    )
+
+    while True:
+        async with AsyncSession(async_engine) as db:
+            rows = (await db.exec(select(USSDSession).where(idle).order_by(USSDSession.id).limit(batch_size))).all()
+            if not rows:
+                break
+            completed = [row for row in rows if row.current_step == SESSION_COMPLETED]
+            db.add_all([_archive_row(row) for row in completed])
+            await db.exec(delete(USSDSession).where(USSDSession.id.in_([row.id for row in rows])))
+            await db.commit()
+        result.archived += len(completed)
+        result.deleted += len(rows) - len(completed)
+        if len(rows) < batch_size:
+            break
+
+    result.seconds = (datetime.utcnow() - result.started_at).total_seconds()
+    last_reap = result
+    return result
+
+
+def compact_database() -> None:
+    """Give the space freed by the reaper back to the filesystem (SQLite) or refresh planner stats (PostgreSQL)."""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if engine.dialect.name == "sqlite":
+            conn.execute(text("VACUUM"))
+        else:
+            conn.execute(text(f"VACUUM ANALYZE {USSDSession.__tablename__}"))
+
+
+def reaper_stats() -> Dict[str, Any]:
+    if last_reap is None:
+        return {"idle_ttl": USSD_REAPER_IDLE_TTL, "last_run": None}
+    return {"idle_ttl": USSD_REAPER_IDLE_TTL, "last_run": {**asdict(last_reap), "pruned": last_reap.pruned}}
+
+
+_reaper_task: Optional[asyncio.Task] = None
+
+
+async def _reap_loop():
+    while True:
+        await asyncio.sleep(USSD_REAPER_INTERVAL)
+        try:
+            result = await reap_sessions()
+            if result.pruned:
+                print(f"USSD session reaper: archived {result.archived}, deleted {result.deleted} abandoned sessions")
+        except Exception as e:
+            print(f"USSD session reaper failed: {e}")
+
+
+def start_session_reaper() -> None:
+    global _reaper_task
+    if _reaper_task is None and USSD_REAPER_INTERVAL > 0:
+        _reaper_task = asyncio.create_task(_reap_loop())
+
+
+def stop_session_reaper() -> None:
+    global _reaper_task
+    if _reaper_task is not None:
+        _reaper_task.cancel()
+        _reaper_task = None
@@ -0,0 +1,349 @@
+"""
+USSD session store.
+
+Live USSD sessions are kept out of the database while the farmer is navigating the
+menus: every hop reads and writes the session state in memory (or in a shared Redis
+instance when running several workers). Once a session ends - or is abandoned and
+times out - it is queued for write-behind persistence and flushed to the
+`USSDSession` table in batches by a background task.
+
+Select the backend with USSD_SESSION_STORE ("memory" or "redis").
+"""
+import asyncio
+import json
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.database import async_engine
+from app.models import USSDSession
+from app.utils.cache import TTLCache
+
+USSD_SESSION_STORE = os.getenv("USSD_SESSION_STORE", "memory").strip().lower()
+USSD_SESSION_TTL = int(os.getenv("USSD_SESSION_TTL", 180))  # seconds of inactivity before a session is abandoned
+USSD_SESSION_MAX_LIVE = int(os.getenv("USSD_SESSION_MAX_LIVE", 50000))
+USSD_SESSION_FLUSH_INTERVAL = float(os.getenv("USSD_SESSION_FLUSH_INTERVAL", 5))
+USSD_SESSION_FLUSH_BATCH = int(os.getenv("USSD_SESSION_FLUSH_BATCH", 200))
+REDIS_URL = os.getenv("REDIS_URL") or "redis://localhost:6379/0"
+
+# current_step of a session that reached an END reply (abandoned sessions keep their menu step)
+SESSION_COMPLETED = "completed"
+
+# Fields copied between the in-memory state and the USSDSession table
+_STATE_FIELDS = ("session_id", "phone_number", "farmer_id", "current_step", "last_step", "temp_data", "created_at", "updated_at", "timestamp")
+
+
+def _state_to_dict(state: USSDSession) -> Dict[str, Any]:
+    return {field: getattr(state, field) for field in _STATE_FIELDS}
+
+
+def _state_to_json(state: USSDSession) -> str:
+    return json.dumps(_state_to_dict(state), default=lambda value: value.isoformat())
+
+
+def _state_from_json(raw: str) -> USSDSession:
+    data = json.loads(raw)
+    for field in ("created_at", "updated_at", "timestamp"):
+        if data.get(field):
+            data[field] = datetime.fromisoformat(data[field])
+    return USSDSession(**data)
+
+
+class USSDSessionStore(ABC):
+    """Interface shared by the session store backends."""
+
+    @abstractmethod
+    async def get(self, session_id: str) -> Optional[USSDSession]:
+        ...
+
+    @abstractmethod
+    async def save(self, state: USSDSession) -> None:
+        ...
+
+    @abstractmethod
+    async def finish(self, state: USSDSession) -> None:
+        """Remove a session from the live set and queue it for persistence."""
+
+    @abstractmethod
+    async def sweep(self) -> int:
+        """Queue abandoned (timed out) sessions for persistence. Returns how many were moved."""
+
+    @abstractmethod
+    async def take_pending(self, limit: int) -> List[USSDSession]:
+        """Pop up to `limit` sessions waiting to be written to the database."""
+
+    @abstractmethod
+    async def requeue(self, states: List[USSDSession]) -> None:
+        """Put sessions taken with take_pending() back at the front of the queue, e.g. after a failed write."""
+
+    @abstractmethod
+    async def release_all(self) -> int:
+        """Queue every live session for persistence (used on shutdown)."""
+
+    @abstractmethod
+    async def stats(self) -> Dict[str, Any]:
+        ...
+
+    async def peek(self, session_id: str) -> Optional[USSDSession]:
+        """Like get(), but left out of the store's hit/miss stats (for tooling such as the load test)."""
+        return await self.get(session_id)
+
+    async def close(self) -> None:
+        pass
+
+    # Replies to retried hops (see ussd_idempotency). Stores shared between workers override
+    # these; for a per-process store the reply cache in ussd_idempotency already covers it.
+
+    async def claim_hop(self, session_id: str, text: str, ttl: float) -> bool:
+        """Reserve a hop for this worker. False if another worker is already processing it."""
+        return True
+
+    async def release_hop(self, session_id: str, text: str) -> None:
+        """Give up a claim without a reply (the hop failed), so a retry can run it."""
+
+    async def get_reply(self, session_id: str, text: str) -> Optional[str]:
+        return None
+
+    async def save_reply(self, session_id: str, text: str, reply: str, ttl: float) -> None:
+        """Store a hop's reply for `ttl` seconds and release its claim."""
+
+
+class InMemorySessionStore(USSDSessionStore):
+    """Per-process store: an LRU dict with an idle TTL. Fast, but not shared between workers."""
+
+    def __init__(self, ttl: int = USSD_SESSION_TTL, maxsize: int = USSD_SESSION_MAX_LIVE):
+        # Sessions that time out are queued whenever they are dropped, whether by sweep() or by a lookup
+        self._live: TTLCache[USSDSession] = TTLCache(maxsize=maxsize, ttl=ttl, on_expire=self._expired)
+        self._pending: List[USSDSession] = []
+
+    def _expired(self, session_id: str, state: USSDSession) -> None:
+        self._pending.append(state)
+
+    async def get(self, session_id: str) -> Optional[USSDSession]:
+        return self._live.get(session_id)
+
+    async def peek(self, session_id: str) -> Optional[USSDSession]:
+        return self._live.get(session_id, count=False)
+
+    async def save(self, state: USSDSession) -> None:
+        # Sessions pushed out by the LRU bound still get persisted
+        evicted = self._live.set(state.session_id, state)
+        self._pending.extend(value for _, value in evicted)
+
+    async def finish(self, state: USSDSession) -> None:
+        self._live.pop(state.session_id)
+        self._pending.append(state)
+
+    async def sweep(self) -> int:
+        return len(self._live.purge_expired())
+
+    async def take_pending(self, limit: int) -> List[USSDSession]:
+        batch, self._pending = self._pending[:limit], self._pending[limit:]
+        return batch
+
+    async def requeue(self, states: List[USSDSession]) -> None:
+        self._pending[:0] = states
+
+    async def release_all(self) -> int:
+        swept = await self.sweep()
+        live = self._live.items()
+        self._live.clear()
+        self._pending.extend(value for _, value in live)
+        return swept + len(live)
+
+    async def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", "pending": len(self._pending), **self._live.stats()}
+
+
+class RedisSessionStore(USSDSessionStore):
+    """
+    Shared store for multi-worker deployments. Session state lives in Redis keys with an
+    idle TTL; a sorted set of last-activity timestamps lets any worker find abandoned
+    sessions, and finished sessions are pushed onto a list that any worker can flush.
+    """
+
+    def __init__(self, url: str = REDIS_URL, ttl: int = USSD_SESSION_TTL, prefix: str = "chapfarm:ussd"):
+        try:
+            import redis.asyncio as aioredis
+        except ImportError as e:
+            raise RuntimeError("USSD_SESSION_STORE=redis requires the 'redis' package. Install it with `pip install redis`.") from e
+
+        self._redis = aioredis.from_url(url, decode_responses=True)
+        self.ttl = ttl
+        self._key_prefix = f"{prefix}:session:"
+        self._activity_key = f"{prefix}:activity"
+        self._pending_key = f"{prefix}:pending"
+        self._hop_prefix = f"{prefix}:hop:"
+
+    def _key(self, session_id: str) -> str:
+        return f"{self._key_prefix}{session_id}"
+
+    def _hop_key(self, session_id: str, text: str) -> str:
+        return f"{self._hop_prefix}{session_id}:{text}"
+
+    async def get(self, session_id: str) -> Optional[USSDSession]:
+        raw = await self._redis.get(self._key(session_id))
+        return _state_from_json(raw) if raw else None
+
+    async def save(self, state: USSDSession) -> None:
+        # Keep the key alive a little longer than the idle TTL so sweep() can still read it
+        now = datetime.utcnow().timestamp()
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.set(self._key(state.session_id), _state_to_json(state), ex=self.ttl * 2)
+            pipe.zadd(self._activity_key, {state.session_id: now})
+            await pipe.execute()
+
+    async def finish(self, state: USSDSession) -> None:
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self._key(state.session_id))
+            pipe.zrem(self._activity_key, state.session_id)
+            pipe.rpush(self._pending_key, _state_to_json(state))
+            await pipe.execute()
+
+    async def _release(self, session_ids: Iterable[str]) -> int:
+        moved = 0
+        for session_id in session_ids:
+            # ZREM is atomic, so only one worker wins the right to move a given session
+            if not await self._redis.zrem(self._activity_key, session_id):
+                continue
+            raw = await self._redis.getdel(self._key(session_id))
+            if raw:
+                await self._redis.rpush(self._pending_key, raw)
+                moved += 1
+        return moved
+
+    async def sweep(self) -> int:
+        cutoff = datetime.utcnow().timestamp() - self.ttl
+        return await self._release(await self._redis.zrangebyscore(self._activity_key, 0, cutoff))
+
+    async def take_pending(self, limit: int) -> List[USSDSession]:
+        raw_items = await self._redis.lpop(self._pending_key, limit) or []
+        return [_state_from_json(raw) for raw in raw_items]
+
+    async def requeue(self, states: List[USSDSession]) -> None:
+        if states:
+            # LPUSH prepends one value at a time, so push in reverse to keep the original order
+            await self._redis.lpush(self._pending_key, *(_state_to_json(state) for state in reversed(states)))
+
+    async def release_all(self) -> int:
+        # Other workers may still be serving these sessions, so shutdown only sweeps
+        return await self.sweep()
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "redis",
+            "size": await self._redis.zcard(self._activity_key),
+            "pending": await self._redis.llen(self._pending_key),
+        }
+
+    async def claim_hop(self, session_id: str, text: str, ttl: float) -> bool:
+        # SET NX is atomic, so exactly one worker wins the hop
+        return bool(await self._redis.set(f"{self._hop_key(session_id, text)}:claim", "1", nx=True, px=int(ttl * 1000)))
+
+    async def release_hop(self, session_id: str, text: str) -> None:
+        await self._redis.delete(f"{self._hop_key(session_id, text)}:claim")
+
+    async def get_reply(self, session_id: str, text: str) -> Optional[str]:
+        return await self._redis.get(f"{self._hop_key(session_id, text)}:reply")
+
+    async def save_reply(self, session_id: str, text: str, reply: str, ttl: float) -> None:
+        key = self._hop_key(session_id, text)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.set(f"{key}:reply", reply, px=int(ttl * 1000))
+            pipe.delete(f"{key}:claim")
+            await pipe.execute()
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+def _create_store() -> USSDSessionStore:
+    if USSD_SESSION_STORE == "redis":
+        return RedisSessionStore()
+    if USSD_SESSION_STORE != "memory":
+        print(f"Unknown USSD_SESSION_STORE '{USSD_SESSION_STORE}', falling back to in-memory store.")
+    return InMemorySessionStore()
+
+
+session_store: USSDSessionStore = _create_store()
+
+
+async def load_persisted_session(session_id: str) -> Optional[USSDSession]:
+    """Read a session back from the database, e.g. after a restart dropped the live copy."""
+    async with AsyncSession(async_engine) as db:
+        row = (await db.exec(select(USSDSession).where(USSDSession.session_id == session_id))).first()
+        return USSDSession(**_state_to_dict(row)) if row else None
+
+
+async def persist_sessions(states: List[USSDSession]) -> int:
+    """Upsert a batch of sessions into the USSDSession table in a single transaction."""
+    if not states:
+        return 0
+
+    # The same session can be queued twice (e.g. swept, then resumed and finished); keep the latest
+    latest: Dict[str, USSDSession] = {}
+    for state in states:
+        latest[state.session_id] = state
+
+    async with AsyncSession(async_engine) as db:
+        existing = (await db.exec(select(USSDSession).where(USSDSession.session_id.in_(list(latest))))).all()
+        rows = {row.session_id: row for row in existing}
+        for session_id, state in latest.items():
+            row = rows.get(session_id)
+            if row is None:
+                db.add(USSDSession(**_state_to_dict(state)))
+            else:
+                for field in _STATE_FIELDS:
+                    setattr(row, field, getattr(state, field))
+                db.add(row)
+        await db.commit()
+    return len(latest)
+
+
+async def flush_sessions(store: USSDSessionStore = session_store, batch_size: int = USSD_SESSION_FLUSH_BATCH) -> int:
+    """Sweep abandoned sessions and write every pending session to the database."""
+    await store.sweep()
+    flushed = 0
+    while True:
+        batch = await store.take_pending(batch_size)
+        if not batch:
+            return flushed
+        try:
+            flushed += await persist_sessions(batch)
+        except Exception:
+            # Put the batch back so the next flush retries it
+            await store.requeue(batch)
+            raise
+
+
+_flusher_task: Optional[asyncio.Task] = None
+
+
+async def _flush_loop():
+    while True:
+        await asyncio.sleep(USSD_SESSION_FLUSH_INTERVAL)
+        try:
+            await flush_sessions()
+        except Exception as e:
+            print(f"USSD session flush failed: {e}")
+
+
+def start_session_flusher() -> None:
+    global _flusher_task
+    if _flusher_task is None:
+        _flusher_task = asyncio.create_task(_flush_loop())
+
+
+async def stop_session_flusher() -> None:
+    """Stop the background flusher and persist everything still held in the store."""
+    global _flusher_task
+    if _flusher_task is not None:
+        _flusher_task.cancel()
+        _flusher_task = None
+    await session_store.release_all()
+    await flush_sessions()
+    await session_store.close()
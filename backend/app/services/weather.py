@@ -1,121 +1,573 @@
+import asyncio
 import httpx
+import numpy as np
+import random
+import time
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 import os
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Awaitable, Callable, Tuple
 from fastapi import HTTPException
 import json
 
+from app.services.forecast_summary import summarize_forecast
+from app.services.gazetteer import UGANDA_UTC_OFFSET, gazetteer, normalize_place_name, remember_geocoded_place
+from app.services.weather_history import record_observation
+from app.utils.cache import TTLCache
+from app.utils.circuit_breaker import CircuitBreaker, RetryBudget
+from app.utils.quota import QuotaGovernor
+from app.utils.singleflight import SingleFlight
+
 # Load API Key from environment variables
 # Make sure your environment variable is set to OPENWEATHER_API_KEY for consistency
 
 API_KEY = os.getenv("OPENWEATHER_API_KEY").strip()
 
-# Base URLs for OpenWeatherMap API
-BASE_GEO_URL = "http://api.openweathermap.org/geo/1.0/direct"
+# Base URLs for OpenWeatherMap API (all HTTPS on one host, so every call can reuse the same pooled connection)
+BASE_GEO_URL = "https://api.openweathermap.org/geo/1.0/direct"
 BASE_WEATHER_URL = "https://api.openweathermap.org/data/2.5/weather"
 BASE_FORECAST_URL = "https://api.openweathermap.org/data/2.5/forecast" # 5-day / 3-hour forecast
 
-async def _fetch_json(url: str) -> Dict[str, Any]:
+# Shared HTTP client settings
+WEATHER_HTTP_TIMEOUT = float(os.getenv("WEATHER_HTTP_TIMEOUT", 10))  # seconds, per read/write/pool wait
+WEATHER_HTTP_CONNECT_TIMEOUT = float(os.getenv("WEATHER_HTTP_CONNECT_TIMEOUT", 5))
+WEATHER_HTTP_MAX_CONNECTIONS = int(os.getenv("WEATHER_HTTP_MAX_CONNECTIONS", 20))
+WEATHER_HTTP_KEEPALIVE = int(os.getenv("WEATHER_HTTP_KEEPALIVE", 10))  # idle connections kept open
+
+# Weather cache settings: how long a payload is fresh, and for how much longer it may still be
+# served (stale) while a background refresh runs
+WEATHER_CACHE_SIZE = int(os.getenv("WEATHER_CACHE_SIZE", 2000))
+WEATHER_CURRENT_TTL = float(os.getenv("WEATHER_CURRENT_TTL", 600))
+WEATHER_CURRENT_STALE = float(os.getenv("WEATHER_CURRENT_STALE", 1800))
+WEATHER_FORECAST_TTL = float(os.getenv("WEATHER_FORECAST_TTL", 3600))
+WEATHER_FORECAST_STALE = float(os.getenv("WEATHER_FORECAST_STALE", 10800))
+WEATHER_BATCH_CONCURRENCY = int(os.getenv("WEATHER_BATCH_CONCURRENCY", 8))  # lookups in flight per batch request
+WEATHER_COORD_PRECISION = int(os.getenv("WEATHER_COORD_PRECISION", 2))  # decimals kept in cache keys, 2 = ~1km
+# Grid mode: snap lookups to a coarser grid of cells (in degrees, 0.1 = ~11km; 0 disables) and
+# interpolate current weather for the exact point from the nearest cell and any cached neighbours
+WEATHER_GRID_RESOLUTION = float(os.getenv("WEATHER_GRID_RESOLUTION") or 0)
+WEATHER_GRID_POWER = float(os.getenv("WEATHER_GRID_POWER", 2))  # inverse-distance weighting exponent
+
+# Failure handling: retries for transient errors (capped at WEATHER_RETRY_BUDGET retries per
+# call overall) and a circuit breaker that stops calling OpenWeather while it keeps failing
+WEATHER_RETRIES = int(os.getenv("WEATHER_RETRIES", 2))
+WEATHER_RETRY_BACKOFF = float(os.getenv("WEATHER_RETRY_BACKOFF", 0.2))  # seconds, doubled per attempt
+WEATHER_RETRY_BUDGET = float(os.getenv("WEATHER_RETRY_BUDGET", 0.2))
+WEATHER_BREAKER_FAILURE_RATE = float(os.getenv("WEATHER_BREAKER_FAILURE_RATE", 0.5))
+WEATHER_BREAKER_MIN_CALLS = int(os.getenv("WEATHER_BREAKER_MIN_CALLS", 5))
+WEATHER_BREAKER_WINDOW = int(os.getenv("WEATHER_BREAKER_WINDOW", 20))
+WEATHER_BREAKER_OPEN_SECONDS = float(os.getenv("WEATHER_BREAKER_OPEN_SECONDS", 30))
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# OpenWeather plan limits (0 = unlimited). Background work (prefetch, dashboards) may use up to
+# 70% of them and web requests 90%, keeping the rest for USSD; cache TTLs stretch (up to
+# WEATHER_QUOTA_MAX_TTL_FACTOR times) once the day's projected usage passes WEATHER_QUOTA_TARGET
+WEATHER_QUOTA_PER_MINUTE = int(os.getenv("WEATHER_QUOTA_PER_MINUTE", 60))
+WEATHER_QUOTA_PER_DAY = int(os.getenv("WEATHER_QUOTA_PER_DAY", 30000))
+WEATHER_QUOTA_TARGET = float(os.getenv("WEATHER_QUOTA_TARGET", 0.8))
+WEATHER_QUOTA_MAX_TTL_FACTOR = float(os.getenv("WEATHER_QUOTA_MAX_TTL_FACTOR", 4))
+
+_http_client: Optional[httpx.AsyncClient] = None
+weather_breaker = CircuitBreaker(
+    "openweather",
+    failure_rate=WEATHER_BREAKER_FAILURE_RATE,
+    window=WEATHER_BREAKER_WINDOW,
+    min_calls=WEATHER_BREAKER_MIN_CALLS,
+    open_seconds=WEATHER_BREAKER_OPEN_SECONDS,
+)
+weather_retry_budget = RetryBudget(ratio=WEATHER_RETRY_BUDGET)
+weather_quota = QuotaGovernor(
+    WEATHER_QUOTA_PER_MINUTE,
+    WEATHER_QUOTA_PER_DAY,
+    target=WEATHER_QUOTA_TARGET,
+    max_ttl_multiplier=WEATHER_QUOTA_MAX_TTL_FACTOR,
+)
+geocode_flights: SingleFlight[Optional[Dict[str, Any]]] = SingleFlight()
+
+
+def _http2_available() -> bool:
+    # httpx only speaks HTTP/2 when the optional 'h2' package is installed
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def create_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=_http2_available(),
+        timeout=httpx.Timeout(WEATHER_HTTP_TIMEOUT, connect=WEATHER_HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=WEATHER_HTTP_MAX_CONNECTIONS, max_keepalive_connections=WEATHER_HTTP_KEEPALIVE),
+    )
+
+
+def open_weather_client() -> httpx.AsyncClient:
+    """Create the shared, connection-pooled client (called on app startup)."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = create_http_client()
+    return _http_client
+
+
+async def close_weather_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """The shared client; created on first use when running outside the app (scripts, manage.py)."""
+    return open_weather_client()
+
+
+class WeatherUnavailable(HTTPException):
+    """OpenWeather can't be called right now: its circuit is open or the call quota is used up."""
+
+    def __init__(self, retry_after: Optional[float] = None,
+                 detail: str = "Weather service temporarily unavailable. Please try again shortly."):
+        super().__init__(status_code=503, detail=detail, headers={"Retry-After": str(int(retry_after or 0) + 1)})
+
+
+def _is_transient(err: Exception) -> bool:
+    # Timeouts, connection errors, rate limiting and server errors are worth retrying and
+    # count against the circuit; other 4xx responses mean the request itself was wrong
+    if isinstance(err, httpx.HTTPStatusError):
+        return err.response.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(err, (httpx.RequestError, json.JSONDecodeError))
+
+
+def _as_http_exception(err: Exception) -> HTTPException:
+    if isinstance(err, httpx.HTTPStatusError):
+        print(f"HTTP error occurred: {err.response.status_code} - {err.response.text}")
+        return HTTPException(status_code=500, detail=f"Weather API HTTP error: {err.response.status_code} - {err.response.text}")
+    if isinstance(err, httpx.RequestError):
+        print(f"Request error occurred: {err}")
+        return HTTPException(status_code=500, detail=f"Weather API request error: {err}")
+    if isinstance(err, json.JSONDecodeError):
+        print(f"JSON decode error: {err}")
+        return HTTPException(status_code=500, detail=f"Weather API response parsing error: {err}")
+    print(f"An unexpected error occurred: {err}")
+    return HTTPException(status_code=500, detail=f"An unexpected error occurred: {err}")
+
+
+async def _fetch_json(url: str, client: Optional[httpx.AsyncClient] = None) -> Dict[str, Any]:
     """
     Helper function to make an HTTP GET request, handle errors, and return JSON response.
+    Uses the shared keep-alive client unless `client` is given.
+
+    Transient failures are retried with jittered exponential backoff (within the retry
+    budget). While the circuit breaker is open, fails immediately with WeatherUnavailable.
     """
     if not API_KEY:
         raise HTTPException(status_code=500, detail="Weather API Key is not configured. Please set the OPENWEATHER_API_KEY environment variable.")
 
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
+    # Checked before the breaker, so a rejected call never takes a half-open probe slot
+    if not weather_quota.allows():
+        raise WeatherUnavailable(60, detail="Weather request quota reached. Please try again later.")
+    ticket = weather_breaker.allow()
+    if ticket is None:
+        raise WeatherUnavailable(weather_breaker.retry_after())
+
+    weather_retry_budget.deposit()
+    attempt = 0
+    while True:
+        weather_quota.record()
+        try:
+            response = await (client or get_http_client()).get(url)
             response.raise_for_status() # Raise an exception for 4xx or 5xx responses
-            return response.json()
-    except httpx.HTTPStatusError as http_err:
-        print(f"HTTP error occurred: {http_err.response.status_code} - {http_err.response.text}")
-        raise HTTPException(status_code=500, detail=f"Weather API HTTP error: {http_err.response.status_code} - {http_err.response.text}")
-    except httpx.RequestError as req_err:
-        print(f"Request error occurred: {req_err}")
-        raise HTTPException(status_code=500, detail=f"Weather API request error: {req_err}")
-    except json.JSONDecodeError as json_err:
-        print(f"JSON decode error: {json_err}")
-        raise HTTPException(status_code=500, detail=f"Weather API response parsing error: {json_err}")
-    except Exception as err:
-        print(f"An unexpected error occurred: {err}")
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {err}")
-
-async def get_coordinates(location_name: str) -> Optional[Dict[str, Any]]:
+            data = response.json()
+        except Exception as err:
+            transient = _is_transient(err)
+            if transient and attempt < WEATHER_RETRIES and weather_quota.allows() and weather_retry_budget.withdraw():
+                attempt += 1
+                # Full jitter: spreads retries from many callers instead of synchronising them
+                await asyncio.sleep(random.uniform(0, WEATHER_RETRY_BACKOFF * 2 ** attempt))
+                continue
+            if transient:
+                weather_breaker.record_failure(ticket)
+            else:
+                weather_breaker.record_success(ticket) # OpenWeather answered; the request was the problem
+            raise _as_http_exception(err) from err
+        weather_breaker.record_success(ticket)
+        return data
+
+async def get_coordinates(location_name: str, client: Optional[httpx.AsyncClient] = None) -> Optional[Dict[str, Any]]:
     """
     Gets latitude, longitude, and timezone offset for a given location name in Uganda.
-    Prioritizes "City" results if available.
+    Known districts and towns (including misspellings) are answered from the local gazetteer;
+    only new places go to the geocoding API, and its answer is stored for next time.
     """
-    geo_url = f"{BASE_GEO_URL}?q={location_name}&limit=5&appid={API_KEY}"
-    data = await _fetch_json(geo_url)
-
-    if not data:
-        return None
-
-    # Try to find an exact match for the location name in Uganda first
-    # This loop is more specific and robust
-    for city_data in data:
-        if city_data.get("name", "").lower() == location_name.lower() and city_data.get("country") == 'UG':
-            return {
-                "lat": city_data['lat'],
-                "lon": city_data['lon'],
-                "timezone_offset": city_data.get('timezone', 0) # Timezone offset in seconds from UTC
-            }
-    
-    # Fallback: find any result in Uganda, prioritizing those with "City" in name if not exact match
-    for city_data in data:
-        if city_data.get("country") == 'UG':
-            return {
-                "lat": city_data['lat'],
-                "lon": city_data['lon'],
-                "timezone_offset": city_data.get('timezone', 0)
-            }
+    place = gazetteer.lookup(location_name)
+    if place:
+        return {"lat": place.lat, "lon": place.lon, "timezone_offset": UGANDA_UTC_OFFSET}
+    if gazetteer.is_unknown(location_name):
+        return None # The API recently had no Ugandan match for this name either
 
+    # Concurrent lookups of the same new place share one geocoding request
+    return await geocode_flights.do(normalize_place_name(location_name), lambda: _geocode(location_name, client))
+
+
+async def _geocode(location_name: str, client: Optional[httpx.AsyncClient] = None) -> Optional[Dict[str, Any]]:
+    geo_url = f"{BASE_GEO_URL}?q={location_name}&limit=5&appid={API_KEY}"
+    data = await _fetch_json(geo_url, client) or []
+
+    # Try to find an exact match for the location name in Uganda first,
+    # then fall back to any result in Uganda
+    ugandan = [city_data for city_data in data if city_data.get("country") == 'UG']
+    exact = [city_data for city_data in ugandan if city_data.get("name", "").lower() == location_name.lower()]
+    if exact or ugandan:
+        city_data = (exact or ugandan)[0]
+        await remember_geocoded_place(location_name, city_data['lat'], city_data['lon'])
+        return {
+            "lat": city_data['lat'],
+            "lon": city_data['lon'],
+            "timezone_offset": UGANDA_UTC_OFFSET # Timezone offset in seconds from UTC
+        }
+
+    gazetteer.mark_unknown(location_name)
     return None # No matching Ugandan location found
 
 
-async def get_current_weather_data(location: str) -> dict:
+@dataclass
+class CachedWeather:
+    payload: Dict[str, Any]
+    fetched_at: float  # time.monotonic() of the upstream fetch
+    derived: Dict[Any, Any] = field(default_factory=dict)  # Values computed from this payload, e.g. rendered summaries
+
+
+class WeatherCache:
+    """
+    Cache of OpenWeather payloads keyed by (endpoint, rounded lat, rounded lon).
+
+    A payload younger than its endpoint's TTL is served as is. Within the following stale
+    window it is still served immediately, and a single background refresh replaces it.
+    Older entries are refetched inline; if that fails because OpenWeather is down (or
+    its circuit is open), the last known payload is served instead of an error. Memory is
+    bounded by LRU eviction. Concurrent fetches of the same key (a burst of farmers in one
+    district) share one upstream call.
+    """
+
+    def __init__(self, ttls: Dict[str, Tuple[float, float]], maxsize: int = WEATHER_CACHE_SIZE, clock: Callable[[], float] = time.monotonic,
+                 ttl_scale: Callable[[], float] = lambda: 1.0):
+        self.ttls = ttls  # endpoint -> (fresh seconds, extra stale seconds)
+        self.ttl_scale = ttl_scale  # Multiplier applied to both, e.g. to save calls when quota runs low
+        self._clock = clock
+        self._entries: TTLCache[CachedWeather] = TTLCache(maxsize=maxsize)
+        self._refreshing: Dict[Tuple, asyncio.Task] = {}
+        self._flights: SingleFlight[Dict[str, Any]] = SingleFlight()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.last_known = 0
+
+    def _ttls(self, endpoint: str) -> Tuple[float, float]:
+        scale = self.ttl_scale()
+        fresh_for, stale_for = self.ttls[endpoint]
+        return fresh_for * scale, stale_for * scale
+
+    async def get_or_fetch(self, endpoint: str, lat: float, lon: float, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        key = (endpoint, lat, lon)
+        fresh_for, stale_for = self._ttls(endpoint)
+        entry = self._entries.get(key, count=False)
+        if entry is not None:
+            age = self._clock() - entry.fetched_at
+            if age < fresh_for:
+                self.hits += 1
+                return entry.payload
+            if age < fresh_for + stale_for:
+                self.stale_hits += 1
+                self._refresh_in_background(key, fetch)
+                return entry.payload
+
+        self.misses += 1
+        try:
+            return await self._load(key, fetch)
+        except HTTPException as e:
+            if entry is None or e.status_code < 500:
+                raise
+            self.last_known += 1
+            return entry.payload
+
+    async def _load(self, key: Tuple, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        async def fetch_and_store() -> Dict[str, Any]:
+            payload = await fetch()
+            self._entries.set(key, CachedWeather(payload=payload, fetched_at=self._clock()))
+            return payload
+
+        return await self._flights.do(key, fetch_and_store)
+
+    def derive(self, endpoint: str, lat: float, lon: float, name: Any, payload: Dict[str, Any], compute: Callable[[Dict[str, Any]], Any]) -> Any:
+        """
+        Memoize `compute(payload)` on the cache entry holding `payload`. A refresh replaces
+        the entry, so derived values never outlive the payload they were computed from.
+        """
+        entry = self._entries.get((endpoint, lat, lon), count=False)
+        if entry is None or entry.payload is not payload:
+            return compute(payload)
+        if name not in entry.derived:
+            entry.derived[name] = compute(payload)
+        return entry.derived[name]
+
+    def peek(self, endpoint: str, lat: float, lon: float) -> Optional[Dict[str, Any]]:
+        """The cached payload if it may still be served (fresh or stale), without fetching or counting a lookup."""
+        entry = self._entries.get((endpoint, lat, lon), count=False)
+        if entry is None or self._clock() - entry.fetched_at >= sum(self._ttls(endpoint)):
+            return None
+        return entry.payload
+
+    def expires_within(self, endpoint: str, lat: float, lon: float, seconds: float) -> bool:
+        """True if the entry is missing or stops being fresh within `seconds`."""
+        entry = self._entries.get((endpoint, lat, lon), count=False)
+        if entry is None:
+            return True
+        return self._clock() - entry.fetched_at + seconds >= self._ttls(endpoint)[0]
+
+    async def refresh(self, endpoint: str, lat: float, lon: float, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Fetch and store a payload regardless of the cached one (used to warm the cache)."""
+        payload = await self._load((endpoint, lat, lon), fetch)
+        self.refreshes += 1
+        return payload
+
+    def _refresh_in_background(self, key: Tuple, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> None:
+        if key in self._refreshing or key in self._flights:
+            return
+        task = asyncio.create_task(self._refresh(key, fetch))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def _refresh(self, key: Tuple, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> None:
+        try:
+            await self._load(key, fetch)
+            self.refreshes += 1
+        except Exception as e:
+            # Keep serving the stale payload until it ages out
+            self.refresh_failures += 1
+            print(f"Background weather refresh failed for {key}: {getattr(e, 'detail', e)}")
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self._entries.maxsize,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "last_known": self.last_known,
+            "refreshing": len(self._refreshing),
+            "evictions": self._entries.evictions,
+            "coalesced": self._flights.coalesced,
+        }
+
+
+weather_cache = WeatherCache(ttls={
+    "current": (WEATHER_CURRENT_TTL, WEATHER_CURRENT_STALE),
+    "forecast": (WEATHER_FORECAST_TTL, WEATHER_FORECAST_STALE),
+}, ttl_scale=weather_quota.ttl_multiplier)
+
+
+WEATHER_ENDPOINTS = {"current": BASE_WEATHER_URL, "forecast": BASE_FORECAST_URL}
+
+
+def weather_cell(coords: Dict[str, Any]) -> Tuple[float, float]:
+    """Round coordinates to the cache grid: nearby points share one cache entry (and one upstream request)."""
+    if WEATHER_GRID_RESOLUTION > 0:
+        return _grid_node(coords['lat']), _grid_node(coords['lon'])
+    return round(coords['lat'], WEATHER_COORD_PRECISION), round(coords['lon'], WEATHER_COORD_PRECISION)
+
+
+def _grid_node(value: float) -> float:
+    return round(round(value / WEATHER_GRID_RESOLUTION) * WEATHER_GRID_RESOLUTION, 6)
+
+
+def interpolate_idw(lat: float, lon: float, points: np.ndarray, values: np.ndarray, power: float = WEATHER_GRID_POWER) -> np.ndarray:
+    """
+    Inverse-distance weighted estimate at (lat, lon) from `values` (one row per point in
+    `points`, given as (lat, lon) rows). Missing (NaN) values are left out per column.
+    """
+    # Equirectangular distances are accurate enough over a few grid cells
+    dy = points[:, 0] - lat
+    dx = (points[:, 1] - lon) * np.cos(np.radians(lat))
+    distances = np.hypot(dx, dy)
+    exact = distances < 1e-9
+    if exact.any():
+        return values[exact.argmax()]
+    weights = np.where(np.isnan(values), 0.0, (1.0 / distances ** power)[:, None])
+    totals = weights.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(totals > 0, (weights * np.nan_to_num(values)).sum(axis=0) / totals, np.nan)
+
+
+def _observation_values(payload: Dict[str, Any]) -> List[float]:
+    main = payload.get("main") or {}
+    return [main.get("temp", np.nan), main.get("humidity", np.nan), (payload.get("rain") or {}).get("1h", 0.0)]
+
+
+async def _grid_weather(coords: Dict[str, Any], client: Optional[httpx.AsyncClient]) -> dict:
+    """
+    Current weather for the exact coordinates from the surrounding grid. Only the nearest
+    cell may cost an upstream call; the 8 cells around it contribute when already cached.
+    """
+    lat, lon = weather_cell(coords)
+    nearest = await weather_cache.get_or_fetch("current", lat, lon, _weather_fetcher("current", lat, lon, client))
+    cells = [(lat, lon)]
+    payloads = [nearest]
+    step = WEATHER_GRID_RESOLUTION
+    for dlat in (-step, 0.0, step):
+        for dlon in (-step, 0.0, step):
+            if dlat == dlon == 0.0:
+                continue
+            cell = (round(lat + dlat, 6), round(lon + dlon, 6))
+            payload = weather_cache.peek("current", *cell)
+            if payload is not None:
+                cells.append(cell)
+                payloads.append(payload)
+
+    temp, humidity, rain = interpolate_idw(
+        coords['lat'], coords['lon'],
+        np.array(cells, dtype=float),
+        np.array([_observation_values(payload) for payload in payloads], dtype=float),
+    )
+    main = dict(nearest.get("main") or {})
+    if not np.isnan(temp):
+        main["temp"] = round(float(temp), 1)
+    if not np.isnan(humidity):
+        main["humidity"] = int(round(float(humidity)))
+    return {
+        **nearest,
+        "coord": {"lat": coords['lat'], "lon": coords['lon']},
+        "main": main,
+        "rain": {"1h": round(float(rain), 2)},
+        "interpolated_from": len(cells),
+    }
+
+
+def _weather_fetcher(endpoint: str, lat: float, lon: float, client: Optional[httpx.AsyncClient]) -> Callable[[], Awaitable[Dict[str, Any]]]:
+    # Add units=metric for Celsius
+    url = f"{WEATHER_ENDPOINTS[endpoint]}?lat={lat}&lon={lon}&appid={API_KEY}&units=metric"
+    if endpoint != "current":
+        return lambda: _fetch_json(url, client)
+
+    async def fetch_and_record() -> Dict[str, Any]:
+        payload = await _fetch_json(url, client)
+        record_observation(lat, lon, payload)  # Each upstream observation joins the WeatherData series
+        return payload
+    return fetch_and_record
+
+
+async def _cached_weather(endpoint: str, coords: Dict[str, Any], client: Optional[httpx.AsyncClient]) -> dict:
+    if endpoint == "current" and WEATHER_GRID_RESOLUTION > 0:
+        return await _grid_weather(coords, client)
+    lat, lon = weather_cell(coords)
+    return await weather_cache.get_or_fetch(endpoint, lat, lon, _weather_fetcher(endpoint, lat, lon, client))
+
+
+async def warm_weather_cell(endpoint: str, lat: float, lon: float, client: Optional[httpx.AsyncClient] = None) -> Dict[str, Any]:
+    """Fetch `endpoint` for a cache cell and store it, even if a cached payload exists."""
+    return await weather_cache.refresh(endpoint, lat, lon, _weather_fetcher(endpoint, lat, lon, client))
+
+
+async def get_cell_forecast(lat: float, lon: float, client: Optional[httpx.AsyncClient] = None) -> Dict[str, Any]:
+    """The (cached) 5-day / 3-hour forecast for a cache cell as returned by weather_cell()."""
+    return await weather_cache.get_or_fetch("forecast", lat, lon, _weather_fetcher("forecast", lat, lon, client))
+
+
+async def get_current_weather_data(location: str, client: Optional[httpx.AsyncClient] = None) -> dict:
     """
     Gets current weather data for a specified location in Uganda.
     Returns temperatures in Celsius.
     """
-    coords = await get_coordinates(location)
+    coords = await get_coordinates(location, client)
     if not coords:
         raise HTTPException(status_code=404, detail=f"Location '{location}' not found in Uganda or coordinates could not be retrieved.")
 
-    lat = coords['lat']
-    lon = coords['lon']
+    return await _cached_weather("current", coords, client)
 
-    # Add units=metric for Celsius
-    weather_url = f"{BASE_WEATHER_URL}?lat={lat}&lon={lon}&appid={API_KEY}&units=metric"
-    
-    current_weather_data = await _fetch_json(weather_url)
-    return current_weather_data
-
-async def get_5day_3hour_forecast_raw(location: str) -> dict:
+async def get_5day_3hour_forecast_raw(location: str, client: Optional[httpx.AsyncClient] = None) -> dict:
     """
     Gets the raw 5-day / 3-hour forecast data from OpenWeatherMap.
     Returns temperatures in Celsius.
     """
-    coords = await get_coordinates(location)
+    coords = await get_coordinates(location, client)
     if not coords:
         raise HTTPException(status_code=404, detail=f"Location '{location}' not found in Uganda or coordinates could not be retrieved.")
 
-    lat = coords['lat']
-    lon = coords['lon']
+    return await _cached_weather("forecast", coords, client)
 
-    # Add units=metric for Celsius
-    forecast_url = f"{BASE_FORECAST_URL}?lat={lat}&lon={lon}&appid={API_KEY}&units=metric"
-    
-    raw_forecast_data = await _fetch_json(forecast_url)
-    return raw_forecast_data
-async def format_weather_response(option: str, location: str) -> str:
+
+def _render_forecast_summary(payload: Dict[str, Any], location: str) -> Dict[str, Any]:
+    summary = summarize_forecast(payload, location)
+    return {"json": summary.as_dict(), "ussd": f"END {summary.ussd_text()}"}
+
+
+async def get_forecast_summary(location: str, client: Optional[httpx.AsyncClient] = None) -> Dict[str, Any]:
+    """
+    Daily forecast summary for a location: {"json": {...}, "ussd": "END ..."}.
+    Stored on the cached forecast payload, so repeat requests skip parsing and formatting.
+    """
+    coords = await get_coordinates(location, client)
+    if not coords:
+        raise HTTPException(status_code=404, detail=f"Location '{location}' not found in Uganda or coordinates could not be retrieved.")
+
+    lat, lon = weather_cell(coords)
+    payload = await _cached_weather("forecast", coords, client)
+    location = location.strip()
+    return weather_cache.derive("forecast", lat, lon, ("summary", location), payload,
+                                lambda forecast: _render_forecast_summary(forecast, location))
+
+async def get_weather_batch(locations: List[str], kind: str = "current", concurrency: int = WEATHER_BATCH_CONCURRENCY,
+                            client: Optional[httpx.AsyncClient] = None) -> Dict[str, Any]:
+    """
+    Weather for many locations in one call: {"results": {location: data}, "errors": {location: {...}}}.
+    Lookups run concurrently (at most `concurrency` at a time) through the weather cache; a
+    failing location is reported in "errors" without failing the rest. Repeated names are
+    looked up once.
+    """
+    lookup = {"current": get_current_weather_data, "forecast_summary": _forecast_summary_json}[kind]
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    names = list(dict.fromkeys(location.strip() for location in locations if location.strip()))
+    results: Dict[str, Any] = {}
+    errors: Dict[str, Any] = {}
+
+    async def run(location: str) -> None:
+        async with semaphore:
+            try:
+                results[location] = await lookup(location, client)
+            except HTTPException as e:
+                errors[location] = {"status_code": e.status_code, "detail": e.detail}
+            except Exception as e:
+                print(f"Batch weather lookup failed for '{location}': {e}")
+                errors[location] = {"status_code": 500, "detail": str(e)}
+
+    await asyncio.gather(*(run(location) for location in names))
+    # Report in request order rather than completion order
+    return {
+        "results": {name: results[name] for name in names if name in results},
+        "errors": {name: errors[name] for name in names if name in errors},
+    }
+
+
+async def _forecast_summary_json(location: str, client: Optional[httpx.AsyncClient] = None) -> Dict[str, Any]:
+    return (await get_forecast_summary(location, client))["json"]
+
+
+async def format_weather_response(option: str, location: str, client: Optional[httpx.AsyncClient] = None) -> str:
     """
     Formats weather responses based on the chosen option.
     Option "1" for current weather, "2" for 5-day/9AM forecast.
     """
     if option == "1":
         # Call the corrected data retrieval function
-        current_weather = await get_current_weather_data(location)
+        current_weather = await get_current_weather_data(location, client)
         
         # Extract data based on OpenWeatherMap's current weather API response structure
         location_name_from_api = current_weather.get("name", location)
@@ -139,66 +591,9 @@ async def format_weather_response(option: str, location: str) -> str:
         )
 
     elif option == "2":
-        # Call the corrected data retrieval function for raw forecast data
-        full_forecast_data = await get_5day_3hour_forecast_raw(location)
-        
-        if not full_forecast_data:
-            return f"END Could not retrieve forecast data for {location}."
-
-        # Get timezone offset for the city from the API response for local time conversion
-        city_timezone_offset_seconds = full_forecast_data.get("city", {}).get("timezone", 0)
-        
-        # Define the desired local hour for the forecast
-        desired_local_hour = 9 # For 9 AM local time
-
-        forecast_entries = full_forecast_data.get("list", [])
-        forecast_text_lines = []
-        seen_dates = set()
-
-        for entry in forecast_entries:
-            utc_dt_str = entry.get("dt_txt")
-            if not utc_dt_str:
-                continue
-
-            # Parse UTC datetime string and convert to local time
-            utc_dt = datetime.strptime(utc_dt_str, "%Y-%m-%d %H:%M:%S")
-            local_dt = utc_dt + timedelta(seconds=city_timezone_offset_seconds)
-
-            current_local_date = local_dt.date()
-            current_local_hour = local_dt.hour
-
-            # Check if this is a new day and the local hour matches our target
-            if current_local_date not in seen_dates and current_local_hour == desired_local_hour:
-                temp_c = entry.get("main", {}).get("temp", "N/A") # Already in Celsius
-                
-                weather_info = entry.get("weather", [{}])[0]
-                condition = weather_info.get("description", "N/A")
-                
-                # OpenWeatherMap 5-day forecast provides rain volume in 'rain.3h'
-                rain_3h_mm = entry.get("rain", {}).get("3h", 0.0) # Rain volume for preceding 3 hours, default 0.0
-                
-                wind_speed_mps = entry.get("wind", {}).get("speed", "N/A")
-                humidity_percent = entry.get("main", {}).get("humidity", "N/A")
-
-                forecast_text_lines.append(
-                    f"\n{current_local_date.strftime('%Y-%m-%d')} ({local_dt.strftime('%I%p').lower()} local): "
-                    f"Condition: {condition.capitalize()},\n Temp: {temp_c}°C, "
-                    f"\nRain(3h): {rain_3h_mm}mm"
-                )
-                seen_dates.add(current_local_date)
-
-                # Stop after finding 5 days of 9 AM forecast
-                if len(seen_dates) >= 5:
-                    break
-        
-        if not forecast_text_lines:
-            return (
-                f"END No 9 AM local time forecast available for {location} for the next 5 days. "
-                "The 3-hour forecast intervals might not align exactly with 9 AM local time for all days. "
-                "Consider requesting hourly forecasts if higher precision is needed (might require a paid plan)."
-            )
-
-        return f"END 5-Day Forecast for {location} (9 AM Local Time):{''.join(forecast_text_lines)}"
+        # Daily summary, computed once per cached forecast payload
+        summary = await get_forecast_summary(location, client)
+        return summary["ussd"]
 
     else:
         return "END Invalid weather option selected. Please choose '1' for current weather or '2' for 5-day forecast."
@@ -0,0 +1,227 @@
+"""
+Rule-based weather alerts.
+
+Cached 5-day forecasts are checked against threshold rules - heavy rain in a 3-hour
+step, a run of dry days, heat - and the results are stored as `WeatherAlert` rows with
+effective/expiry windows, which the USSD "View Weather Alerts" menu reads. Rules are
+evaluated once per cached forecast payload (see `WeatherCache.derive`) and the alerts are
+written for every tracked location in one transaction, so farmer requests never
+evaluate anything.
+
+Runs after every weather prefetch, or once with `python manage.py generate-alerts`.
+"""
+import os
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.database import async_engine
+from app.models import WeatherAlert
+from app.services.alert_index import active_alerts, alert_location_key
+from app.services.forecast_summary import DEFAULT_UTC_OFFSET, entry_timestamp, summarize_forecast
+from app.services.weather import get_coordinates, weather_cache, weather_cell
+
+ALERT_HEAVY_RAIN_MM = float(os.getenv("ALERT_HEAVY_RAIN_MM", 10))  # mm of rain in one 3-hour step
+ALERT_DRY_DAYS = int(os.getenv("ALERT_DRY_DAYS", 3))  # consecutive forecast days below ALERT_DRY_DAY_MM
+ALERT_DRY_DAY_MM = float(os.getenv("ALERT_DRY_DAY_MM", 1))
+ALERT_HEAT_C = float(os.getenv("ALERT_HEAT_C", 32))
+ALERT_IMMEDIATE_HOURS = float(os.getenv("ALERT_IMMEDIATE_HOURS", 24))  # alerts starting sooner are "Immediate"
+
+STEP_SECONDS = 3 * 3600
+
+# Alert types owned by the generator; alerts of other types are never touched
+HEAVY_RAIN = "Heavy Rain"
+DRY_SPELL = "Dry Spell"
+HEAT = "Heat"
+GENERATED_TYPES = (HEAVY_RAIN, DRY_SPELL, HEAT)
+
+
+@dataclass(frozen=True)
+class AlertCandidate:
+    alert_type: str
+    severity: str
+    urgency_level: str
+    certainty_level: str
+    alert_message: str
+    effective_time: datetime  # UTC; when the forecast was evaluated, so farmers are warned ahead of the onset
+    expires_time: datetime  # UTC; end of the forecast condition
+
+
+@dataclass
+class AlertRunResult:
+    locations: int = 0
+    uncached: int = 0  # Locations without a cached forecast (not evaluated)
+    inserted: int = 0
+    updated: int = 0
+    retired: int = 0
+    seconds: float = 0.0
+
+
+last_alert_run: Optional[AlertRunResult] = None
+
+
+def _utc(timestamp: int) -> datetime:
+    return datetime.fromtimestamp(int(timestamp), tz=timezone.utc).replace(tzinfo=None)
+
+
+def _runs(mask: np.ndarray) -> List[Tuple[int, int]]:
+    """(start, end) index pairs of consecutive True values, end exclusive."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+
+def _urgency(start: datetime, now: datetime) -> str:
+    return "Immediate" if start - now <= timedelta(hours=ALERT_IMMEDIATE_HOURS) else "Advisory"
+
+
+def _certainty(start: datetime, now: datetime) -> str:
+    # Forecast skill drops with lead time
+    hours = (start - now).total_seconds() / 3600
+    return "High" if hours < 48 else "Medium" if hours < 96 else "Low"
+
+
+def evaluate_forecast(payload: Dict[str, Any], now: Optional[datetime] = None) -> List[AlertCandidate]:
+    """Apply the threshold rules to a 5-day / 3-hour forecast payload."""
+    now = now or datetime.utcnow()
+    offset = timedelta(seconds=(payload.get("city") or {}).get("timezone", DEFAULT_UTC_OFFSET))
+
+    def local(moment: datetime) -> str:
+        return (moment + offset).strftime("%a %d %H:%M")
+
+    entries = [entry for entry in payload.get("list") or [] if "dt" in entry or "dt_txt" in entry]
+    if not entries:
+        return []
+    timestamps = np.array([entry_timestamp(entry) for entry in entries], dtype=np.int64)
+    rain = np.array([(entry.get("rain") or {}).get("3h", 0.0) for entry in entries], dtype=float)
+    temps = np.array([(entry.get("main") or {}).get("temp_max", (entry.get("main") or {}).get("temp", np.nan))
+                      for entry in entries], dtype=float)
+    alerts: List[AlertCandidate] = []
+
+    wet = _runs(rain >= ALERT_HEAVY_RAIN_MM)
+    if wet:
+        start, end = _utc(timestamps[wet[0][0]]), _utc(timestamps[wet[-1][1] - 1] + STEP_SECONDS)
+        peak = float(rain[rain >= ALERT_HEAVY_RAIN_MM].max())
+        alerts.append(AlertCandidate(
+            alert_type=HEAVY_RAIN,
+            severity="High" if peak >= 2 * ALERT_HEAVY_RAIN_MM else "Medium",
+            urgency_level=_urgency(start, now),
+            certainty_level=_certainty(start, now),
+            alert_message=f"Heavy rain from {local(start)}, up to {peak:.0f}mm in 3 hours. Clear drainage and protect harvested crops.",
+            effective_time=now,
+            expires_time=end,
+        ))
+
+    hot = _runs(temps >= ALERT_HEAT_C)
+    if hot:
+        start, end = _utc(timestamps[hot[0][0]]), _utc(timestamps[hot[-1][1] - 1] + STEP_SECONDS)
+        peak = float(np.nanmax(temps))
+        alerts.append(AlertCandidate(
+            alert_type=HEAT,
+            severity="High" if peak >= ALERT_HEAT_C + 3 else "Medium",
+            urgency_level=_urgency(start, now),
+            certainty_level=_certainty(start, now),
+            alert_message=f"Heat from {local(start)}, up to {peak:.0f}°C. Water crops early or late and give livestock shade and water.",
+            effective_time=now,
+            expires_time=end,
+        ))
+
+    days = summarize_forecast(payload, "").days
+    dry = [run for run in _runs(np.array([day.rain_mm < ALERT_DRY_DAY_MM for day in days], dtype=bool))
+           if run[1] - run[0] >= ALERT_DRY_DAYS]
+    if dry:
+        first, last = max(dry, key=lambda run: run[1] - run[0])
+        # Days are local calendar days; store the window in UTC
+        start = datetime.strptime(days[first].date, "%Y-%m-%d") - offset
+        end = datetime.strptime(days[last - 1].date, "%Y-%m-%d") + timedelta(days=1) - offset
+        alerts.append(AlertCandidate(
+            alert_type=DRY_SPELL,
+            severity="High" if last - first >= ALERT_DRY_DAYS + 2 else "Medium",
+            urgency_level=_urgency(start, now),
+            certainty_level=_certainty(start, now),
+            alert_message=f"{last - first} dry days from {(start + offset).strftime('%a %d')}. Conserve soil moisture (mulch) and delay planting.",
+            effective_time=now,
+            expires_time=end,
+        ))
+    return alerts
+
+
+async def generate_weather_alerts(locations: List[str]) -> AlertRunResult:
+    """
+    Evaluate the cached forecast of each location and upsert its generated alerts: one
+    row per (location, alert type), updated in place while the condition persists and
+    expired early once the forecast no longer shows it. Locations whose forecast isn't
+    cached are skipped, so this never fetches forecasts itself.
+    """
+    global last_alert_run
+    started = time.monotonic()
+    now = datetime.utcnow()
+    result = AlertRunResult(locations=len(locations))
+
+    # Keyed like the alert index, so spellings of one place ("Kampala", "kampala") share rows
+    wanted: Dict[Tuple[str, str], Tuple[str, AlertCandidate]] = {}
+    evaluated: Set[str] = set()
+    for location in locations:
+        coords = await get_coordinates(location)
+        if not coords:
+            result.uncached += 1
+            continue
+        lat, lon = weather_cell(coords)
+        payload = weather_cache.peek("forecast", lat, lon)
+        if payload is None:
+            result.uncached += 1
+            continue
+        location_key = alert_location_key(location)
+        evaluated.add(location_key)
+        # Alerts depend only on the payload, so cells shared by many locations are evaluated once
+        for alert in weather_cache.derive("forecast", lat, lon, "alerts", payload, evaluate_forecast):
+            if alert.expires_time > now:
+                wanted.setdefault((location_key, alert.alert_type), (location, alert))
+
+    if evaluated:
+        async with AsyncSession(async_engine) as session:
+            existing = (await session.exec(select(WeatherAlert).where(
+                WeatherAlert.location_key.in_(evaluated),
+                WeatherAlert.alert_type.in_(GENERATED_TYPES),
+                WeatherAlert.expires_time > now,
+            ).order_by(WeatherAlert.id))).all()
+            current: Dict[Tuple[str, str], WeatherAlert] = {}
+            duplicates: List[WeatherAlert] = []
+            for row in existing:
+                if (row.location_key, row.alert_type) in current:
+                    duplicates.append(row)  # Left by runs that keyed rows on the raw location
+                else:
+                    current[(row.location_key, row.alert_type)] = row
+
+            for key, (location, alert) in wanted.items():
+                row = current.pop(key, None)
+                if row is None:
+                    row = WeatherAlert(location=location, location_key=key[0], **asdict(alert))
+                    result.inserted += 1
+                else:
+                    for field, value in asdict(alert).items():
+                        if field != "effective_time":  # Stays the time it was first issued
+                            setattr(row, field, value)
+                    row.timestamp = now
+                    result.updated += 1
+                session.add(row)
+
+            # Conditions that dropped out of the forecast
+            for row in [*current.values(), *duplicates]:
+                row.expires_time = now
+                session.add(row)
+                result.retired += 1
+            await session.commit()
+        await active_alerts.refresh()
+
+    result.seconds = round(time.monotonic() - started, 3)
+    last_alert_run = result
+    return result
+
+
+def alert_stats() -> Dict[str, Any]:
+    return {"last_run": asdict(last_alert_run) if last_alert_run else None}
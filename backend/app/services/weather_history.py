@@ -0,0 +1,233 @@
+"""
+Weather observation history.
+
+Every current-weather payload fetched from OpenWeather (live lookups and prefetches, not
+cache hits) is recorded as a `WeatherData` row. Rows are buffered in memory and written
+in bulk - one INSERT per batch instead of one transaction per observation - when the
+buffer reaches WEATHER_HISTORY_BATCH rows or every WEATHER_HISTORY_FLUSH_INTERVAL seconds.
+
+Observations are stored per weather cache cell (`WeatherData.location` is the rounded
+"lat,lon" of the cell), so every place name resolving to the same cell shares one series.
+Reads go through the (location, recorded_at) index and can be downsampled to hourly or
+daily buckets in the database.
+"""
+import asyncio
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.database import async_engine, engine
+from app.models import WeatherData
+
+WEATHER_HISTORY_BATCH = int(os.getenv("WEATHER_HISTORY_BATCH", 100))
+WEATHER_HISTORY_FLUSH_INTERVAL = float(os.getenv("WEATHER_HISTORY_FLUSH_INTERVAL", 30))  # seconds, 0 disables recording
+WEATHER_HISTORY_MAX_BUFFER = int(os.getenv("WEATHER_HISTORY_MAX_BUFFER", 5000))  # oldest rows dropped beyond this
+
+RESOLUTIONS = ("raw", "hour", "day")
+
+
+def cell_location(lat: float, lon: float) -> str:
+    """The `WeatherData.location` value for a weather cache cell."""
+    return f"{lat},{lon}"
+
+
+def observation_row(location: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Map an OpenWeather current-weather payload onto a WeatherData row (None if it has no temperature)."""
+    temperature = (payload.get("main") or {}).get("temp")
+    if temperature is None:
+        return None
+    observed = payload.get("dt")
+    recorded_at = (datetime.fromtimestamp(observed, tz=timezone.utc).replace(tzinfo=None) if observed
+                   else datetime.utcnow())
+    return {
+        "location": location,
+        "temperature": float(temperature),
+        "precipitation": float((payload.get("rain") or {}).get("1h", 0.0)),
+        "recorded_at": recorded_at,
+    }
+
+
+class WeatherHistoryWriter:
+    """
+    Buffers observations and bulk-inserts them. OpenWeather updates a station every
+    10 minutes or so, so a refetch that returns the same observation time for a cell is
+    not recorded again.
+    """
+
+    def __init__(self, batch_size: int = WEATHER_HISTORY_BATCH, max_buffer: int = WEATHER_HISTORY_MAX_BUFFER):
+        self.batch_size = batch_size
+        self.max_buffer = max_buffer
+        self._buffer: List[Dict[str, Any]] = []
+        self._last_seen: Dict[str, datetime] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self.recorded = 0
+        self.duplicates = 0
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+
+    def record(self, lat: float, lon: float, payload: Dict[str, Any]) -> None:
+        location = cell_location(lat, lon)
+        row = observation_row(location, payload)
+        if row is None:
+            return
+        if self._last_seen.get(location) == row["recorded_at"]:
+            self.duplicates += 1
+            return
+        self._last_seen[location] = row["recorded_at"]
+        self._buffer.append(row)
+        self.recorded += 1
+        if len(self._buffer) > self.max_buffer:
+            # The database has been unreachable for a while; keep the newest observations
+            overflow = len(self._buffer) - self.max_buffer
+            del self._buffer[:overflow]
+            self.dropped += overflow
+        if len(self._buffer) >= self.batch_size and self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_in_background())
+
+    async def _flush_in_background(self) -> None:
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"Weather history flush failed: {e}")
+        finally:
+            self._flush_task = None
+
+    async def flush(self) -> int:
+        """Write everything buffered so far. On failure the rows are kept for the next flush."""
+        async with self._flush_lock:
+            written = 0
+            while self._buffer:
+                # Take the batch out first: record() may trim the buffer while the insert is awaited
+                batch, self._buffer = self._buffer[:self.batch_size], self._buffer[self.batch_size:]
+                try:
+                    async with AsyncSession(async_engine) as session:
+                        await session.execute(insert(WeatherData), batch)
+                        await session.commit()
+                except Exception:
+                    self._buffer[:0] = batch
+                    raise
+                written += len(batch)
+                self.written += len(batch)
+                self.flushes += 1
+            return written
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "buffered": len(self._buffer),
+            "recorded": self.recorded,
+            "duplicates": self.duplicates,
+            "written": self.written,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+        }
+
+
+weather_history = WeatherHistoryWriter()
+
+
+def record_observation(lat: float, lon: float, payload: Dict[str, Any]) -> None:
+    if WEATHER_HISTORY_FLUSH_INTERVAL > 0:
+        weather_history.record(lat, lon, payload)
+
+
+def ensure_history_index() -> None:
+    """create_all() skips tables that already exist, so add the composite index to older databases."""
+    for index in WeatherData.__table__.indexes:
+        index.create(engine, checkfirst=True)
+
+
+def _bucket(resolution: str, dialect: str):
+    if dialect == "sqlite":
+        fmt = "%Y-%m-%d %H:00:00" if resolution == "hour" else "%Y-%m-%d 00:00:00"
+        return func.strftime(fmt, WeatherData.recorded_at)
+    return func.date_trunc(resolution, WeatherData.recorded_at)
+
+
+async def query_history(
+    session: AsyncSession,
+    location: str,
+    start: datetime,
+    end: datetime,
+    resolution: str = "raw",
+    offset: int = 0,
+    limit: int = 100,
+) -> List[Dict[str, Any]]:
+    """
+    Observations for one cell between `start` and `end` (UTC), oldest first. With
+    resolution "hour" or "day" each row summarises one bucket instead.
+    """
+    window = (WeatherData.location == location, WeatherData.recorded_at >= start, WeatherData.recorded_at < end)
+    if resolution == "raw":
+        statement = (select(WeatherData).where(*window)
+                     .order_by(WeatherData.recorded_at).offset(offset).limit(limit))
+        rows = (await session.exec(statement)).all()
+        return [
+            {"recorded_at": row.recorded_at, "temperature": row.temperature, "precipitation": row.precipitation}
+            for row in rows
+        ]
+
+    bucket = _bucket(resolution, session.bind.dialect.name).label("bucket")
+    statement = (
+        select(
+            bucket,
+            func.count().label("observations"),
+            func.avg(WeatherData.temperature),
+            func.min(WeatherData.temperature),
+            func.max(WeatherData.temperature),
+            func.max(WeatherData.precipitation),
+        )
+        .where(*window)
+        .group_by(bucket)
+        .order_by(bucket)
+        .offset(offset)
+        .limit(limit)
+    )
+    rows: List[Tuple] = (await session.exec(statement)).all()
+    return [
+        {
+            # SQLite's strftime() buckets come back as text
+            "recorded_at": datetime.fromisoformat(bucket_start) if isinstance(bucket_start, str) else bucket_start,
+            "observations": count,
+            "temperature_avg": round(avg, 2),
+            "temperature_min": low,
+            "temperature_max": high,
+            "precipitation_max": rain,  # Highest 1-hour rain reading in the bucket
+        }
+        for bucket_start, count, avg, low, high, rain in rows
+    ]
+
+
+_history_task: Optional[asyncio.Task] = None
+
+
+async def _history_loop():
+    while True:
+        await asyncio.sleep(WEATHER_HISTORY_FLUSH_INTERVAL)
+        try:
+            await weather_history.flush()
+        except Exception as e:
+            print(f"Weather history flush failed: {e}")
+
+
+def start_weather_history() -> None:
+    global _history_task
+    if _history_task is None and WEATHER_HISTORY_FLUSH_INTERVAL > 0:
+        _history_task = asyncio.create_task(_history_loop())
+
+
+async def stop_weather_history() -> None:
+    """Stop the background writer and write out whatever is still buffered."""
+    global _history_task
+    if _history_task is not None:
+        _history_task.cancel()
+        _history_task = None
+    try:
+        await weather_history.flush()
+    except Exception as e:
+        print(f"Weather history flush failed: {e}")
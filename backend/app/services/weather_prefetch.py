@@ -0,0 +1,163 @@
+"""
+Scheduled weather prefetcher.
+
+Most weather lookups are for places where farmers are registered, so the cache is
+warmed for every distinct `Farmer.location` ahead of demand: locations are resolved to
+cache cells (rounded coordinates, so neighbouring villages share one request) and each
+cell's current weather and forecast are fetched shortly before the cached copy would
+expire. USSD weather lookups at peak times then become cache reads.
+
+Upstream calls are paced to stay within WEATHER_PREFETCH_CALLS_PER_MINUTE, leaving the
+rest of the OpenWeather quota for live requests. Runs every WEATHER_PREFETCH_INTERVAL
+seconds from the app, or on demand with `POST /admin/weather/prefetch`. The cache is
+per process, so warming only helps when it happens inside the running server.
+"""
+import asyncio
+import os
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.database import async_engine
+from app.models import Farmer
+from app.services.gazetteer import gazetteer
+from app.services.weather import get_coordinates, warm_weather_cell, weather_cache, weather_cell
+from app.services.weather_alerts import generate_weather_alerts
+from app.utils.quota import PRIORITY_BACKGROUND, call_priority
+
+WEATHER_PREFETCH_INTERVAL = float(os.getenv("WEATHER_PREFETCH_INTERVAL", 600))  # seconds between runs, 0 disables
+WEATHER_PREFETCH_CALLS_PER_MINUTE = float(os.getenv("WEATHER_PREFETCH_CALLS_PER_MINUTE", 30))
+WEATHER_PREFETCH_ENDPOINTS = tuple(
+    endpoint.strip() for endpoint in os.getenv("WEATHER_PREFETCH_ENDPOINTS", "current,forecast").split(",") if endpoint.strip()
+)
+
+
+class CallPacer:
+    """Spaces out upstream calls so they never exceed `per_minute`."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next_at = 0.0
+
+    async def wait(self) -> None:
+        now = time.monotonic()
+        if self._next_at > now:
+            await asyncio.sleep(self._next_at - now)
+        self._next_at = max(now, self._next_at) + self.interval
+
+
+@dataclass
+class PrefetchResult:
+    locations: int = 0
+    cells: int = 0
+    fetched: int = 0
+    already_fresh: int = 0
+    unresolved: int = 0
+    failed: int = 0
+    seconds: float = 0.0
+
+
+last_prefetch: Optional[PrefetchResult] = None
+
+
+async def farmer_locations() -> List[str]:
+    """Distinct locations farmers registered with (their region when no location was given)."""
+    async with AsyncSession(async_engine) as session:
+        rows = (await session.exec(select(Farmer.location, Farmer.region).distinct())).all()
+    names = {(location or region or "").strip() for location, region in rows}
+    return sorted(name for name in names if name)
+
+
+async def prefetch_weather(
+    calls_per_minute: float = WEATHER_PREFETCH_CALLS_PER_MINUTE,
+    interval: float = WEATHER_PREFETCH_INTERVAL,
+    endpoints: Tuple[str, ...] = WEATHER_PREFETCH_ENDPOINTS,
+) -> PrefetchResult:
+    """
+    Warm the weather cache for every farmer location. A cell is refetched only if its
+    cached payload would stop being fresh before the next run (`interval` seconds away).
+    """
+    global last_prefetch
+    started = time.monotonic()
+    pacer = CallPacer(calls_per_minute)
+    result = PrefetchResult()
+
+    locations = await farmer_locations()
+    result.locations = len(locations)
+
+    cells: Set[Tuple[float, float]] = set()
+    for location in locations:
+        if gazetteer.lookup(location) is None and not gazetteer.is_unknown(location):
+            await pacer.wait()  # Resolving this one costs a geocoding call
+        try:
+            coords = await get_coordinates(location)
+        except Exception as e:
+            print(f"Weather prefetch could not resolve '{location}': {getattr(e, 'detail', e)}")
+            coords = None
+        if coords:
+            cells.add(weather_cell(coords))
+        else:
+            result.unresolved += 1
+    result.cells = len(cells)
+
+    for lat, lon in sorted(cells):
+        for endpoint in endpoints:
+            if not weather_cache.expires_within(endpoint, lat, lon, interval):
+                result.already_fresh += 1
+                continue
+            await pacer.wait()
+            try:
+                await warm_weather_cell(endpoint, lat, lon)
+                result.fetched += 1
+            except Exception as e:
+                result.failed += 1
+                print(f"Weather prefetch failed for {endpoint} at {lat},{lon}: {getattr(e, 'detail', e)}")
+
+    result.seconds = round(time.monotonic() - started, 3)
+    last_prefetch = result
+    return result
+
+
+def prefetch_stats() -> Dict[str, Any]:
+    return {
+        "interval": WEATHER_PREFETCH_INTERVAL,
+        "calls_per_minute": WEATHER_PREFETCH_CALLS_PER_MINUTE,
+        "last_run": asdict(last_prefetch) if last_prefetch else None,
+    }
+
+
+_prefetch_task: Optional[asyncio.Task] = None
+
+
+async def _prefetch_loop():
+    with call_priority(PRIORITY_BACKGROUND):  # Prefetching only uses quota that live requests leave
+        while True:
+            try:
+                result = await prefetch_weather()
+                print(f"Weather prefetch: {result.fetched} fetched, {result.already_fresh} fresh, "
+                      f"{result.failed} failed across {result.cells} cells in {result.seconds}s")
+            except Exception as e:
+                print(f"Weather prefetch failed: {e}")
+            try:
+                # Alerts follow the forecasts just refreshed
+                alerts = await generate_weather_alerts(await farmer_locations())
+                print(f"Weather alerts: {alerts.inserted} new, {alerts.updated} updated, {alerts.retired} retired")
+            except Exception as e:
+                print(f"Weather alert generation failed: {e}")
+            await asyncio.sleep(WEATHER_PREFETCH_INTERVAL)
+
+
+def start_weather_prefetcher() -> None:
+    global _prefetch_task
+    if _prefetch_task is None and WEATHER_PREFETCH_INTERVAL > 0:
+        _prefetch_task = asyncio.create_task(_prefetch_loop())
+
+
+def stop_weather_prefetcher() -> None:
+    global _prefetch_task
+    if _prefetch_task is not None:
+        _prefetch_task.cancel()
+        _prefetch_task = None
@@ -1,8 +1,8 @@
 import json
 import boto3
-from sqlmodel import Session, select
-from ..models import Advice
-from ..utils.fuzzy import find_similar_advice
+from botocore.exceptions import ClientError
+from ..services.advice_queue import AdviceWorkerPool
+from ..utils.fuzzy import advice_index, find_similar_advice
 import os
 from typing import Optional
 from fastapi import FastAPI, HTTPException
@@ -20,13 +20,11 @@ def normalize_text(text: str) -> str:
     """Lowercase and strip to help fuzzy matching."""
     return text.lower().strip()
 
-async def get_ai_advice(session: Session, user_input: str) -> str:
-    # # First, try to fetch a similar existing response from DB
-    # # Uncomment and ensure find_similar_advice is correctly implemented if you use DB caching
-    # cached_response = find_similar_advice(session, user_input)
-    # if cached_response:
-    #     return cached_response
-
+def invoke_advice_model(user_input: str) -> str:
+    """
+    Blocking Bedrock call that turns a farmer's question into advice.
+    Runs inside the advice worker pool, never directly on the event loop.
+    """
     # Define the model ID for Amazon Nova Lite
     # Ensure this exact model ID is enabled in your Bedrock account for the specified region
     model_id = "amazon.nova-lite-v1:0"
@@ -90,15 +88,9 @@ async def get_ai_advice(session: Session, user_input: str) -> str:
         # The WARNING about unexpected format is removed, as we now handle this specific format.
         # --- END CORRECTED PARSING LOGIC ---
 
-        # Save the AI-generated advice to DB for future reference
-        new_advice = Advice(query_text=user_input, response_text=output_text)
-        session.add(new_advice)
-        session.commit()
-        session.refresh(new_advice)
-
         return output_text
 
-    except boto3.exceptions.ClientError as e:
+    except ClientError as e:
         error_code = e.response.get("Error", {}).get("Code")
         error_message = e.response.get("Error", {}).get("Message")
         print(f"ERROR: Bedrock Client Error ({error_code}): {error_message}")
@@ -107,5 +99,21 @@ async def get_ai_advice(session: Session, user_input: str) -> str:
         print(f"ERROR: Failed to parse JSON response from Bedrock: {e}")
         raise HTTPException(status_code=500, detail="Failed to get AI advice: Invalid JSON response from AI model.")
     except Exception as e:
-        print(f"ERROR: An unexpected error occurred in get_ai_advice: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to get AI advice: An unexpected error occurred. {e}")
\ No newline at end of file
+        print(f"ERROR: An unexpected error occurred in invoke_advice_model: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to get AI advice: An unexpected error occurred. {e}")
+
+
+# Shared pool that runs Bedrock calls on a bounded number of workers.
+# Started and stopped with the app (see main.py); workers store each answer as an Advice row
+# and add it to the in-memory advice index.
+advice_pool = AdviceWorkerPool(generate=invoke_advice_model, on_stored=advice_index.add)
+
+
+async def get_ai_advice(user_input: str) -> str:
+    # First, reuse the answer to the same or a similar earlier question (in-memory index)
+    cached_response = find_similar_advice(user_input)
+    if cached_response:
+        return cached_response
+
+    # Raises AdviceQueueFull when too many requests are already waiting
+    return await advice_pool.ask(user_input)
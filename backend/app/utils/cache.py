@@ -0,0 +1,103 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Hashable, List, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+_MISSING = object()
+
+
+class TTLCache(Generic[V]):
+    """
+    Small in-process LRU cache with a per-entry time-to-live.
+
+    Entries are kept in an OrderedDict so the least recently used entry is always
+    at the front and can be evicted in O(1) when the cache is full. Expired entries
+    are dropped lazily on access, or in bulk with `purge_expired()`; either way
+    `on_expire` (if given) is called with each dropped (key, value).
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None, clock: Callable[[], float] = time.monotonic,
+                 on_expire: Optional[Callable[[Hashable, V], None]] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl  # None means entries never expire, only LRU eviction applies
+        self._clock = clock
+        self._on_expire = on_expire
+        self._data: "OrderedDict[Hashable, Tuple[float, V]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def _expired(self, expires_at: float) -> bool:
+        return expires_at <= self._clock()
+
+    def get(self, key: Hashable, default: Any = None, count: bool = True) -> Any:
+        """Return the cached value (marking it most recently used) or `default`."""
+        item = self._data.get(key)
+        if item is None or self._expired(item[0]):
+            if item is not None:
+                del self._data[key]
+                if self._on_expire is not None:
+                    self._on_expire(key, item[1])
+            if count:
+                self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        if count:
+            self.hits += 1
+        return item[1]
+
+    def set(self, key: Hashable, value: V, ttl: Optional[float] = None) -> List[Tuple[Hashable, V]]:
+        """
+        Store a value, optionally with a TTL overriding the cache default.
+        Returns the (key, value) pairs evicted to make room, so callers can act on them.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = self._clock() + ttl if ttl is not None else float("inf")
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+
+        evicted = []
+        while len(self._data) > self.maxsize:
+            old_key, (_, old_value) = self._data.popitem(last=False)
+            self.evictions += 1
+            evicted.append((old_key, old_value))
+        return evicted
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def items(self) -> List[Tuple[Hashable, V]]:
+        """Snapshot of live (non-expired) entries, least recently used first."""
+        return [(key, value) for key, (expires_at, value) in self._data.items() if not self._expired(expires_at)]
+
+    def purge_expired(self) -> List[Tuple[Hashable, V]]:
+        """Drop every expired entry and return them."""
+        now = self._clock()
+        expired = [(key, value) for key, (expires_at, value) in self._data.items() if expires_at <= now]
+        for key, value in expired:
+            del self._data[key]
+            if self._on_expire is not None:
+                self._on_expire(key, value)
+        return expired
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
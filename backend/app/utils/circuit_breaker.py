@@ -0,0 +1,152 @@
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker.
+
+    Closed: calls go through and their outcomes are kept in a sliding window of the last
+    `window` calls. Once at least `min_calls` are recorded and the failure rate reaches
+    `failure_rate`, the circuit opens. Open: calls are rejected immediately for
+    `open_seconds`. Half-open: up to `half_open_probes` trial calls are let through; a
+    success closes the circuit, a failure opens it again.
+
+    `allow()` hands out a ticket (the breaker's generation, bumped on every state change)
+    that must be passed back when recording the outcome. Outcomes of calls admitted in an
+    earlier generation - e.g. a slow call that finishes after the circuit opened - are
+    ignored, so only the probes decide whether a half-open circuit closes.
+    """
+
+    def __init__(self, name: str, failure_rate: float = 0.5, window: int = 20, min_calls: int = 5,
+                 open_seconds: float = 30.0, half_open_probes: int = 1, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self._clock = clock
+        self._outcomes: Deque[bool] = deque(maxlen=window)  # True = failure
+        self._state = CLOSED
+        self._generation = 1  # Never 0, so a ticket is always truthy
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_started = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._generation += 1
+            self._probes = 0
+        return self._state
+
+    def allow(self) -> Optional[int]:
+        """
+        A ticket if a call may go ahead now, else None. Every allowed call must be followed
+        by a record_*() with its ticket.
+        """
+        state = self.state
+        if state == CLOSED:
+            return self._generation
+        if state == HALF_OPEN:
+            # A probe that never reported back (e.g. cancelled) must not wedge the circuit;
+            # a new generation makes its outcome void if it does turn up
+            if self._probes >= self.half_open_probes and self._clock() - self._probe_started >= self.open_seconds:
+                self._generation += 1
+                self._probes = 0
+            if self._probes < self.half_open_probes:
+                self._probes += 1
+                self._probe_started = self._clock()
+                return self._generation
+        self.rejected += 1
+        return None
+
+    def _current(self, ticket: int) -> bool:
+        """Whether a call was admitted in the current state (late outcomes are dropped)."""
+        return ticket == self._generation and self._state != OPEN
+
+    def record_success(self, ticket: int) -> None:
+        if not self._current(ticket):
+            return
+        if self._state == HALF_OPEN:
+            self._close()
+        else:
+            self._outcomes.append(False)
+
+    def record_failure(self, ticket: int) -> None:
+        if not self._current(ticket):
+            return
+        if self._state == HALF_OPEN:
+            self._open()
+            return
+        self._outcomes.append(True)
+        if len(self._outcomes) >= self.min_calls and self._current_failure_rate() >= self.failure_rate:
+            self._open()
+
+    def _current_failure_rate(self) -> float:
+        return sum(self._outcomes) / len(self._outcomes) if self._outcomes else 0.0
+
+    def _open(self) -> None:
+        self._state = OPEN
+        self._generation += 1
+        self._opened_at = self._clock()
+        self.times_opened += 1
+
+    def _close(self) -> None:
+        self._state = CLOSED
+        self._generation += 1
+        self._outcomes.clear()
+
+    def retry_after(self) -> Optional[float]:
+        """Seconds until the next probe is allowed, if the circuit is open."""
+        if self.state != OPEN:
+            return None
+        return max(self.open_seconds - (self._clock() - self._opened_at), 0.0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "state": self.state,
+            "failure_rate": round(self._current_failure_rate(), 4),
+            "window_calls": len(self._outcomes),
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "retry_after": self.retry_after(),
+        }
+
+
+class RetryBudget:
+    """
+    Caps retries to a fraction of regular calls, so retries can't multiply load on a
+    dependency that is already struggling. Every call deposits `ratio` of a token (up to
+    `max_tokens`); every retry spends a whole one.
+    """
+
+    def __init__(self, ratio: float = 0.2, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self.retries = 0
+        self.denied = 0
+
+    def deposit(self) -> None:
+        self._tokens = min(self._tokens + self.ratio, self.max_tokens)
+
+    def withdraw(self) -> bool:
+        if self._tokens >= 1:
+            self._tokens -= 1
+            self.retries += 1
+            return True
+        self.denied += 1
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"tokens": round(self._tokens, 2), "retries": self.retries, "denied": self.denied}
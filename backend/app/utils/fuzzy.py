@@ -1,17 +1,95 @@
+import os
+import re
+from typing import Any, Dict, List, Optional
+
 from rapidfuzz import process, fuzz
-from sqlmodel import select
+from sqlmodel import Session, select
+
+from app.database import engine
 from app.models import Advice
-from typing import Optional
 
-def find_similar_advice(session, user_input: str, threshold: int = 85) -> Optional[str]:
-    """Search for a similar previous query using fuzzy matching."""
-    existing_advice = session.exec(select(Advice)).all()
-    queries = [advice.query_text for advice in existing_advice]
+ADVICE_MATCH_THRESHOLD = int(os.getenv("ADVICE_MATCH_THRESHOLD", 85))  # rapidfuzz token_sort_ratio, 0-100
+
+
+def normalize_query(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace, so trivially different questions share a key."""
+    return " ".join(re.sub(r"[^\w\s]+", " ", text.lower()).split())
+
+
+class AdviceIndex:
+    """
+    Resident index of answered advice questions.
+
+    Lookups first try the normalized question as a dict key; otherwise one rapidfuzz call
+    scores it against every stored question, with a score cutoff that lets rapidfuzz skip
+    hopeless candidates early. Built once at startup and extended as answers are stored,
+    so the Advice table is never scanned per request.
+    """
+
+    def __init__(self, threshold: int = ADVICE_MATCH_THRESHOLD):
+        self.threshold = threshold
+        self._answers: Dict[str, str] = {}  # Normalized question -> answer
+        self._keys: List[str] = []
+        self.exact_hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, query: str, answer: str) -> None:
+        key = normalize_query(query)
+        if not key:
+            return
+        if key not in self._answers:
+            self._keys.append(key)
+        self._answers[key] = answer  # The latest answer wins
+
+    def load(self, rows: List[Advice]) -> None:
+        self._answers = {}
+        self._keys = []
+        for row in rows:
+            self.add(row.query_text, row.response_text)
+
+    def lookup(self, query: str, threshold: Optional[int] = None) -> Optional[str]:
+        key = normalize_query(query)
+        if not key:
+            return None
+        answer = self._answers.get(key)
+        if answer is not None:
+            self.exact_hits += 1
+            return answer
+
+        # Keys are already normalized, so no processor is needed
+        match = process.extractOne(key, self._keys, scorer=fuzz.token_sort_ratio,
+                                   score_cutoff=self.threshold if threshold is None else threshold)
+        if match:
+            self.fuzzy_hits += 1
+            return self._answers[match[0]]
+
+        self.misses += 1
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.exact_hits + self.fuzzy_hits + self.misses
+        return {
+            "size": len(self._keys),
+            "exact_hits": self.exact_hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.exact_hits + self.fuzzy_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+advice_index = AdviceIndex()
+
+
+def load_advice_index() -> None:
+    """Build the in-memory index from the Advice table (called on app startup)."""
+    with Session(engine) as session:
+        advice_index.load(session.exec(select(Advice).order_by(Advice.id)).all())
 
-    match = process.extractOne(user_input, queries, scorer=fuzz.token_sort_ratio)
-    if match and match[1] >= threshold:
-        matched_query = match[0]
-        matched_advice = next((a for a in existing_advice if a.query_text == matched_query), None)
-        return matched_advice.response_text if matched_advice else None
 
-    return None
+def find_similar_advice(user_input: str, threshold: Optional[int] = None) -> Optional[str]:
+    """Answer to a similar previous question, if there is one."""
+    return advice_index.lookup(user_input, threshold)
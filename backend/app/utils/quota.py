@@ -0,0 +1,135 @@
+import contextvars
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, Iterator, Optional
+
+SECONDS_PER_DAY = 86400
+
+# Call priorities, most important first
+PRIORITY_USSD = "ussd"
+PRIORITY_WEB = "web"
+PRIORITY_BACKGROUND = "background"  # Prefetching and dashboards
+
+_priority: contextvars.ContextVar[str] = contextvars.ContextVar("call_priority", default=PRIORITY_WEB)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+@contextmanager
+def call_priority(priority: str) -> Iterator[None]:
+    """Run the enclosed calls (and tasks started from them) at `priority`."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class QuotaGovernor:
+    """
+    Tracks calls against a per-minute and a per-day (UTC) limit.
+
+    Lower priorities may only use a share of each limit, keeping the rest for more
+    important callers: with the default shares, background work stops at 70% of the
+    quota and web traffic at 90%, while USSD can use all of it. `ttl_multiplier()`
+    grows as the day's projected usage passes `target` of the daily limit, so caches
+    can stretch their TTLs and spend fewer calls.
+    """
+
+    def __init__(self, per_minute: int, per_day: int, shares: Optional[Dict[str, float]] = None,
+                 target: float = 0.8, max_ttl_multiplier: float = 4.0, clock: Callable[[], float] = time.time):
+        self.per_minute = per_minute
+        self.per_day = per_day
+        self.shares = shares or {PRIORITY_USSD: 1.0, PRIORITY_WEB: 0.9, PRIORITY_BACKGROUND: 0.7}
+        self.target = target
+        self.max_ttl_multiplier = max_ttl_multiplier
+        self._clock = clock
+        self._recent: Deque[float] = deque()  # Call times within the last minute
+        self._day = self._day_number(clock())
+        self.calls_today = 0
+        self.calls_by_priority: Dict[str, int] = {}
+        self.rejected_by_priority: Dict[str, int] = {}
+
+    @staticmethod
+    def _day_number(now: float) -> int:
+        return int(now // SECONDS_PER_DAY)
+
+    def _roll(self, now: float) -> None:
+        while self._recent and now - self._recent[0] >= 60:
+            self._recent.popleft()
+        day = self._day_number(now)
+        if day != self._day:
+            self._day = day
+            self.calls_today = 0
+
+    def allows(self, priority: Optional[str] = None) -> bool:
+        """Whether a call at `priority` fits in its share of the quota; rejections are counted."""
+        priority = priority or current_priority()
+        self._roll(self._clock())
+        share = self.shares.get(priority, self.shares[PRIORITY_WEB])
+        if ((self.per_minute and len(self._recent) >= self.per_minute * share)
+                or (self.per_day and self.calls_today >= self.per_day * share)):
+            self.rejected_by_priority[priority] = self.rejected_by_priority.get(priority, 0) + 1
+            return False
+        return True
+
+    def record(self, priority: Optional[str] = None) -> None:
+        """Count a call that is being made."""
+        priority = priority or current_priority()
+        now = self._clock()
+        self._roll(now)
+        self._recent.append(now)
+        self.calls_today += 1
+        self.calls_by_priority[priority] = self.calls_by_priority.get(priority, 0) + 1
+
+    def _elapsed_today(self, now: float) -> float:
+        return now - self._day * SECONDS_PER_DAY
+
+    def projected_daily_calls(self) -> float:
+        """Calls the day will end with at the rate so far (the first hour counts as a whole hour)."""
+        now = self._clock()
+        self._roll(now)
+        return self.calls_today * SECONDS_PER_DAY / max(self._elapsed_today(now), 3600)
+
+    def ttl_multiplier(self) -> float:
+        if not self.per_day:
+            return 1.0
+        pressure = self.projected_daily_calls() / (self.per_day * self.target)
+        return round(min(max(pressure, 1.0), self.max_ttl_multiplier), 2)
+
+    def seconds_to_exhaustion(self) -> Optional[float]:
+        """When the daily limit runs out at the current rate, or None if it lasts until the reset."""
+        if not self.per_day:
+            return None
+        now = self._clock()
+        self._roll(now)
+        remaining = self.per_day - self.calls_today
+        if remaining <= 0:
+            return 0.0
+        # The busier of the last minute and the day's average, to err on the early side
+        rate = max(len(self._recent) / 60, self.calls_today / max(self._elapsed_today(now), 1))
+        if rate <= 0:
+            return None
+        seconds = remaining / rate
+        return seconds if seconds < SECONDS_PER_DAY - self._elapsed_today(now) else None
+
+    def stats(self) -> Dict[str, Any]:
+        now = self._clock()
+        exhaustion = self.seconds_to_exhaustion()
+        return {
+            "per_minute_limit": self.per_minute,
+            "per_day_limit": self.per_day,
+            "calls_last_minute": len(self._recent),
+            "calls_today": self.calls_today,
+            "projected_daily_calls": round(self.projected_daily_calls()),
+            "ttl_multiplier": self.ttl_multiplier(),
+            "exhausts_at": (datetime.fromtimestamp(now + exhaustion, tz=timezone.utc).isoformat()
+                            if exhaustion is not None else None),
+            "resets_at": datetime.fromtimestamp((self._day + 1) * SECONDS_PER_DAY, tz=timezone.utc).isoformat(),
+            "calls_by_priority": dict(self.calls_by_priority),
+            "rejected_by_priority": dict(self.rejected_by_priority),
+        }
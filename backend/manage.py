@@ -1,13 +1,109 @@
-import typer
+from pathlib import Path
+from typing import Optional
 
-from app.scripts.create_super_admin import create_super_admin
+import typer
 
 app = typer.Typer()
 
 @app.command()
 def create_super():
     """Creates a super admin user and admin record"""
+    from app.scripts.create_super_admin import create_super_admin
     create_super_admin()
 
+@app.command()
+def ussd_loadtest(
+    sessions: int = typer.Option(200, help="Number of synthetic sessions to simulate"),
+    concurrency: int = typer.Option(20, help="Sessions in flight at once"),
+    farmers: int = typer.Option(100, help="Registered farmers to seed for the simulated traffic"),
+    replay: Optional[Path] = typer.Option(None, help="Replay a captured traffic file (JSON lines) instead"),
+    upstream_latency_ms: float = typer.Option(50, help="Latency of the stubbed weather/Bedrock/SMS calls"),
+    database_url: Optional[str] = typer.Option(None, help="Database to run against (default: a temporary SQLite file)"),
+    seed: int = typer.Option(42, help="Random seed for the synthetic traffic"),
+):
+    """Load-tests POST /ussd in-process and reports per-state p50/p95/p99 latency"""
+    # Imported lazily: the harness configures the environment before the app is loaded
+    from app.scripts.ussd_loadtest import run_loadtest
+    run_loadtest(sessions, concurrency, farmers, replay, upstream_latency_ms, database_url, seed)
+
+@app.command()
+def reap_ussd_sessions(
+    idle_ttl: int = typer.Option(None, help="Seconds since a session's last hop before it is pruned (default: USSD_REAPER_IDLE_TTL)"),
+    vacuum: bool = typer.Option(False, help="VACUUM the database afterwards to reclaim the freed space"),
+):
+    """Archives completed and deletes abandoned USSD sessions from the USSDSession table"""
+    import asyncio
+    from app.database import async_engine, create_db_and_tables
+    from app.services.ussd_reaper import USSD_REAPER_IDLE_TTL, compact_database, reap_sessions
+
+    async def run():
+        try:
+            return await reap_sessions(idle_ttl if idle_ttl is not None else USSD_REAPER_IDLE_TTL)
+        finally:
+            await async_engine.dispose()
+
+    create_db_and_tables()
+    result = asyncio.run(run())
+    typer.echo(f"Archived {result.archived} completed and deleted {result.deleted} abandoned USSD sessions in {result.seconds:.2f}s")
+    if vacuum:
+        compact_database()
+        typer.echo("Database compacted.")
+
+@app.command()
+def generate_alerts(
+    prefetch: bool = typer.Option(True, help="Refresh the farmer locations' forecasts first (the cache starts empty in a new process)"),
+):
+    """Evaluates cached forecasts for every farmer location and stores the resulting weather alerts"""
+    import asyncio
+    from app.database import async_engine, create_db_and_tables
+    from app.services.gazetteer import load_gazetteer
+    from app.services.weather import close_weather_client
+    from app.services.weather_alerts import generate_weather_alerts
+    from app.services.weather_history import stop_weather_history
+    from app.services.weather_prefetch import farmer_locations, prefetch_weather as run_prefetch
+
+    async def run():
+        try:
+            if prefetch:
+                await run_prefetch(endpoints=("forecast",))
+            return await generate_weather_alerts(await farmer_locations())
+        finally:
+            await stop_weather_history()  # Write out the observations recorded by this run
+            await close_weather_client()
+            await async_engine.dispose()
+
+    create_db_and_tables()
+    load_gazetteer()
+    result = asyncio.run(run())
+    typer.echo(f"{result.locations} farmer locations ({result.uncached} without a forecast): "
+               f"{result.inserted} alerts created, {result.updated} updated, {result.retired} retired in {result.seconds}s")
+
+@app.command()
+def send_forecast_digest(
+    dry_run: bool = typer.Option(False, help="Print each cell's message and recipient count instead of sending"),
+    days: int = typer.Option(None, help="Days of forecast per message (default: FORECAST_DIGEST_DAYS)"),
+):
+    """SMS the daily forecast to every registered farmer, one message per weather cell"""
+    import asyncio
+    from app.database import async_engine, create_db_and_tables
+    from app.services.gazetteer import load_gazetteer
+    from app.services.weather import close_weather_client
+    from app.services.forecast_digest import FORECAST_DIGEST_DAYS, send_forecast_digest as run_digest
+    from app.services.weather_history import stop_weather_history
+
+    async def run():
+        try:
+            return await run_digest(days=days if days is not None else FORECAST_DIGEST_DAYS, dry_run=dry_run)
+        finally:
+            await stop_weather_history()  # Write out the observations recorded by this run
+            await close_weather_client()
+            await async_engine.dispose()
+
+    create_db_and_tables()
+    load_gazetteer()
+    result = asyncio.run(run())
+    typer.echo(f"{result.farmers} farmers in {result.cells} cells ({result.unresolved} unresolved): "
+               f"{result.sent} sent via {result.requests} SMS requests, {result.failed} failed in {result.seconds}s")
+
 if __name__ == "__main__":
     app()